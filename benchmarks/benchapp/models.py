@@ -0,0 +1,9 @@
+from django.db import models
+
+
+class Article(models.Model):
+    title = models.CharField(max_length=100)
+    section = models.CharField(max_length=20)
+
+    def get_absolute_url(self):
+        return '/%s/%d/' % (self.section, self.pk)
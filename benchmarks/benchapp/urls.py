@@ -0,0 +1,5 @@
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('benchapp.views',
+    url(r'^(?P<section>\w+)/(?P<pk>\d+)/$', 'article'),
+)
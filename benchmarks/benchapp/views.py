@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+
+from benchapp.models import Article
+
+
+def article(request, section, pk):
+    article = get_object_or_404(Article, pk=pk, section=section)
+    header = '<html><head><title>%s</title></head><body>' % article.title
+    footer = '</body></html>'
+    body = 'x' * max(settings.BENCH_PAGE_SIZE - len(header) - len(footer), 0)
+    return HttpResponse(header + body + footer)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Benchmarks StaticGenerator against a synthetic Django project.
+
+Every benchmark runs in its own process, against a fresh SQLite database of
+--objects articles spread over --sections sections, for every page size and
+web root. The results are written as JSON, so runs of different versions can
+be compared::
+
+    python benchmarks/run.py --objects 2000 --sizes 1024,65536 --output results.json
+
+The 'syscalls' are the filesystem calls made through the os module during
+the measured phase. Use strace -c for the real system calls.
+"""
+from multiprocessing import Process, Queue
+from Queue import Empty
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+BENCHMARKS = ('extract', 'publish', 'delete', 'middleware')
+
+# Filesystem functions counted as syscalls
+COUNTED_CALLS = (
+    (os, 'open'), (os, 'write'), (os, 'close'), (os, 'rename'), (os, 'chmod'),
+    (os, 'stat'), (os, 'lstat'), (os, 'remove'), (os, 'unlink'), (os, 'mkdir'),
+    (os, 'rmdir'), (os, 'listdir'), (os, 'fsync'), (os, 'link'), (os, 'symlink'),
+)
+
+
+def configure(options, work_dir, web_root, page_size):
+    from django.conf import settings
+
+    settings.configure(
+        DEBUG=False,
+        DATABASES={'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(work_dir, 'bench.db'),
+        }},
+        INSTALLED_APPS=('benchapp',),
+        ROOT_URLCONF='benchapp.urls',
+        MIDDLEWARE_CLASSES=('django.middleware.common.CommonMiddleware',),
+        WEB_ROOT=web_root,
+        SERVER_NAME='bench.example.com',
+        STATIC_GENERATOR_URLS=tuple(r'^/section%d/\d+/$' % i for i in range(options.patterns)),
+        STATIC_GENERATOR_EXECUTOR=options.executor,
+        STATIC_GENERATOR_WORKERS=options.workers,
+        STATIC_GENERATOR_DURABILITY=options.durability,
+        STATIC_GENERATOR_BATCH_SIZE=options.batch_size,
+        BENCH_PAGE_SIZE=page_size,
+    )
+
+    from django.core.management import call_command
+    from benchapp.models import Article
+
+    call_command('syncdb', interactive=False, verbosity=0)
+    Article.objects.bulk_create([
+        Article(title='Article %d' % i, section='section%d' % (i % options.sections))
+        for i in range(options.objects)
+    ])
+
+
+class CallCounter(object):
+    """Counts the calls made to the functions in COUNTED_CALLS"""
+
+    def __init__(self):
+        self.counts = {}
+        self.originals = []
+
+    def wrap(self, module, name):
+        original = getattr(module, name)
+
+        def counted(*args, **kw):
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return original(*args, **kw)
+
+        self.originals.append((module, name, original))
+        setattr(module, name, counted)
+
+    def __enter__(self):
+        for module, name in COUNTED_CALLS:
+            if hasattr(module, name):
+                self.wrap(module, name)
+        return self
+
+    def __exit__(self, *exc_info):
+        for module, name, original in self.originals:
+            setattr(module, name, original)
+
+
+class TimedGenerator(object):
+    """Times every call made to a method of a StaticGenerator"""
+
+    def __init__(self, generator, method):
+        self.latencies = []
+        original = getattr(generator, method)
+
+        def timed(*args, **kw):
+            start = time.time()
+            try:
+                return original(*args, **kw)
+            finally:
+                self.latencies.append(time.time() - start)
+
+        setattr(generator, method, timed)
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))]
+
+
+def measure(run, latencies):
+    with CallCounter() as counter:
+        start = time.time()
+        pages = run()
+        seconds = time.time() - start
+
+    return {
+        'pages': pages,
+        'seconds': seconds,
+        'pages_per_second': pages / seconds if seconds else None,
+        'latency_ms': {
+            'p50': percentile(latencies, 50) * 1000 if latencies else None,
+            'p99': percentile(latencies, 99) * 1000 if latencies else None,
+        },
+        'syscalls': counter.counts,
+    }
+
+
+def bench_extract(generator):
+    def run():
+        return sum(1 for path in generator.resources)
+    return measure(run, [])
+
+
+def bench_publish(generator):
+    timer = TimedGenerator(generator, 'publish_from_path')
+    return measure(lambda: len(generator.publish()), timer.latencies)
+
+
+def bench_delete(generator):
+    generator.publish()
+    timer = TimedGenerator(generator, 'delete_from_path')
+    return measure(lambda: len(generator.delete()), timer.latencies)
+
+
+def bench_middleware(generator):
+    from staticgenerator.middleware import StaticGeneratorMiddleware
+
+    middleware = StaticGeneratorMiddleware()
+    handler, request_factory = generator.get_handler()
+    exchanges = []
+
+    for path in generator.resources:
+        request = request_factory.get(path)
+        exchanges.append((request, handler(request)))
+
+    latencies = []
+
+    def run():
+        for request, response in exchanges:
+            start = time.time()
+            middleware.process_response(request, response)
+            latencies.append(time.time() - start)
+        return len(exchanges)
+
+    return measure(run, latencies)
+
+
+def run_benchmark(queue, options, name, web_root_name, web_root_base, page_size):
+    work_dir = tempfile.mkdtemp(prefix='staticgenerator-bench-')
+    web_root = tempfile.mkdtemp(prefix='staticgenerator-bench-', dir=web_root_base)
+
+    try:
+        configure(options, work_dir, web_root, page_size)
+
+        from staticgenerator import StaticGenerator
+        from benchapp.models import Article
+
+        generator = StaticGenerator(Article)
+        result = globals()['bench_%s' % name](generator)
+        result.update({
+            'benchmark': name,
+            'web_root': web_root_name,
+            'page_size': page_size,
+            'objects': options.objects,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+        queue.put(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(web_root, ignore_errors=True)
+
+
+def get_web_roots(options):
+    web_roots = [('disk', options.disk_root)]
+    if os.path.isdir(options.tmpfs_root):
+        web_roots.append(('tmpfs', options.tmpfs_root))
+    return web_roots
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks StaticGenerator')
+    parser.add_argument('--objects', type=int, default=1000, help='number of articles (pages)')
+    parser.add_argument('--sections', type=int, default=10, help='number of directories the pages are spread over')
+    parser.add_argument('--patterns', type=int, default=100, help='number of STATIC_GENERATOR_URLS patterns')
+    parser.add_argument('--sizes', default='1024,16384,131072', help='comma separated page sizes in bytes')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help='comma separated benchmarks to run')
+    parser.add_argument('--executor', default='serial', help='STATIC_GENERATOR_EXECUTOR')
+    parser.add_argument('--workers', type=int, default=None, help='STATIC_GENERATOR_WORKERS')
+    parser.add_argument('--durability', default='fast', help="STATIC_GENERATOR_DURABILITY: 'fast', 'file' or 'safe'")
+    parser.add_argument('--batch-size', type=int, default=None, help='STATIC_GENERATOR_BATCH_SIZE')
+    parser.add_argument('--disk-root', default=tempfile.gettempdir(), help='directory of the disk web roots')
+    parser.add_argument('--tmpfs-root', default='/dev/shm', help='directory of the tmpfs web roots')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    options = parser.parse_args(argv)
+
+    results = []
+    for name in options.benchmarks.split(','):
+        for web_root_name, web_root_base in get_web_roots(options):
+            for page_size in [int(size) for size in options.sizes.split(',')]:
+                queue = Queue()
+                process = Process(target=run_benchmark,
+                                  args=(queue, options, name, web_root_name, web_root_base, page_size))
+                process.start()
+
+                result = None
+                while result is None and (process.is_alive() or not queue.empty()):
+                    try:
+                        result = queue.get(timeout=1)
+                    except Empty:
+                        pass
+
+                process.join()
+                if result is None:
+                    sys.exit('The %s benchmark failed' % name)
+
+                results.append(result)
+                sys.stderr.write('%(benchmark)s %(web_root)s %(page_size)d: %(pages_per_second).0f pages/s\n' % result)
+
+    output = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': vars(options),
+        'results': results,
+    }, indent=2, sort_keys=True)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+    else:
+        print output
+
+
+if __name__ == '__main__':
+    main()
@@ -17,7 +17,11 @@ setup(
     author="Jared Kuolt",
     author_email="me@superjared.com",
     url="http://superjared.com/projects/static-generator/",
-    packages=['staticgenerator'],
+    packages=[
+        'staticgenerator',
+        'staticgenerator.management',
+        'staticgenerator.management.commands',
+    ],
     extras_require={
         'tests': tests_require,
     },
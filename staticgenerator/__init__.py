@@ -7,19 +7,160 @@ from django.db.models.base import ModelBase
 from django.db.models.manager import Manager
 from django.db.models import Model
 from django.db.models.query import QuerySet
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.conf import settings
 from django.test.client import RequestFactory
+from django.test.signals import setting_changed
+from django.utils.importlib import import_module
+from contextlib import contextmanager
+from collections import OrderedDict
+from itertools import groupby, islice
+from multiprocessing.pool import ThreadPool
+from Queue import Empty, Queue
 from handlers import DummyHandler
+from executors import EXECUTORS, ThreadPoolExecutor
+from cache import get_cache
+from compression import COMPRESSORS, OPTIONAL_COMPRESSORS, VARIANT_EXTENSIONS
+from dependencies import get_instance_key, get_model_key, is_recording, start_recording, stop_recording
+from index import DependencyIndex, PublishedIndex, escape_glob, get_index
+from generations import Generations
+from storage import STORAGES, FileSystemStorage
+from writer import BackgroundWriter
 
-import stat
+import copy
+import errno
+import hashlib
 import os
+import shutil
 import tempfile
+import threading
+import time
+
+
+DURABILITY_LEVELS = ('fast', 'file', 'safe')
+
+# Bumped every time a setting changes, so the cached handlers get rebuilt.
+_settings_version = 0
+
+# Server name and web root resolved from the django settings, shared by every
+# StaticGenerator until a setting or the Site changes.
+_resolved = {}
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+# Refreshes requested by each thread within a transaction, see flush_refreshes
+_deferred = threading.local()
+
+
+def get_shard(path, count):
+    """Returns the shard (0 to count - 1) of path, the same on every host"""
+    if isinstance(path, unicode):
+        path = path.encode('utf-8')
+    return int(hashlib.md5(path).hexdigest(), 16) % count
+
+
+def clear_resolved(**kw):
+    """Forgets the cached server name and web root"""
+    _resolved.clear()
+
+
+def _settings_changed(**kw):
+    global _settings_version
+    _settings_version += 1
+    clear_resolved()
+
+setting_changed.connect(_settings_changed)
 
 
 class StaticGeneratorException(Exception):
     pass
 
 
+class Resources(object):
+    """
+    Lazy list of the paths of some resources. The resources are extracted
+    again every time it's iterated, so nothing is loaded before publishing.
+    """
+
+    def __init__(self, generator, resources):
+        self.generator = generator
+        self.resources = resources
+
+    def __iter__(self):
+        paths = self.unique(self.generator.extract_resources(self.resources))
+
+        if self.generator.hooks:
+            return self.instrument(paths)
+        return paths
+
+    def unique(self, paths):
+        """
+        Skips the paths already seen, as when a page is listed twice. Only
+        the paths of the current chunk of chunk_size paths are remembered,
+        so memory doesn't grow with the site.
+        """
+        size = self.generator.chunk_size or 1000
+        seen = set()
+        for path in paths:
+            if path not in seen:
+                if len(seen) >= size:
+                    seen.clear()
+                seen.add(path)
+                yield path
+
+    def instrument(self, paths):
+        while True:
+            start = time.time()
+            try:
+                path = next(paths)
+            except StopIteration:
+                return
+
+            self.generator.instrument('extract', path, start)
+            yield path
+
+
+class Directories(object):
+    """
+    The directories known to exist, up to size of them: the least recently
+    used ones are forgotten, and checked again when needed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, directory):
+        with self.lock:
+            if directory not in self.entries:
+                return False
+            self.entries[directory] = self.entries.pop(directory)
+            return True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, directory):
+        with self.lock:
+            self.entries.pop(directory, None)
+            self.entries[directory] = True
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, directory):
+        with self.lock:
+            self.entries.pop(directory, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 class StaticGenerator(object):
     """
     The StaticGenerator class is created for Django applications, like a blog,
@@ -39,6 +180,33 @@ class StaticGenerator(object):
         from staticgenerator import quick_delete
         quick_delete('/page-to-delete/')
 
+    Large publishes can be spread over a pool of threads or processes::
+
+        gen = StaticGenerator(Post, executor='process', workers=8,
+                              collect_errors=True)
+        gen.publish()
+        for path, error in gen.errors:
+            ...
+
+    The executor can also be set with settings.STATIC_GENERATOR_EXECUTOR
+    ('serial', 'thread' or 'process') and settings.STATIC_GENERATOR_WORKERS.
+
+    With settings.STATIC_GENERATOR_DEPENDENCY_INDEX set to a file name, the
+    model instances used to render every page are recorded, so that saving
+    or deleting an object publishes again only the pages that displayed it
+    (and, when it's created or deleted, those that listed its model)::
+
+        from staticgenerator import connect_dependencies
+        connect_dependencies(Post, FlatPage)
+
+    The time spent extracting, rendering, writing and deleting every path
+    can be reported to hooks (see staticgenerator.instrumentation)::
+
+        from staticgenerator.instrumentation import Stats
+        stats = Stats()
+        StaticGenerator(Post, hooks=[stats]).publish()
+        stats.report()
+
     The most effective usage is to associate a StaticGenerator with a model's
     post_save and post_delete signal.
 
@@ -49,14 +217,251 @@ class StaticGenerator(object):
     def __init__(self, *resources, **kw):
         self.parse_dependencies(kw)
 
-        self.resources = self.extract_resources(resources)
-        self.server_name = self.get_server_name(kw)
-        self.web_root = self.get_web_root(kw)
+        self.resources = Resources(self, resources)
+        self.server_name = self.get_resolved(kw, 'server_name', self.get_server_name, fallback='localhost')
+        self.web_roots = self.get_setting(kw, 'web_roots', 'STATIC_GENERATOR_WEB_ROOTS')
+        self.web_root = self.web_roots[0] if self.web_roots else self.get_resolved(kw, 'web_root', self.get_web_root)
+        self.storage = self.get_storage(kw)
+        self.executor = self.get_executor(kw)
+        self.collect_errors = self.get_setting(kw, 'collect_errors', 'STATIC_GENERATOR_COLLECT_ERRORS', False)
+        self.shard = kw.get('shard', None)
+        self.chunk_size = self.get_setting(kw, 'chunk_size', 'STATIC_GENERATOR_CHUNK_SIZE', 1000)
+        self.skip_unchanged = self.get_setting(kw, 'skip_unchanged', 'STATIC_GENERATOR_SKIP_UNCHANGED', False)
+        self.stats = {'written': 0, 'skipped': 0}
+        self.directories = Directories(self.get_setting(kw, 'directory_cache_size',
+                                                        'STATIC_GENERATOR_DIRECTORY_CACHE_SIZE', 10000))
+        self.batch_size = self.get_setting(kw, 'batch_size', 'STATIC_GENERATOR_BATCH_SIZE')
+        self.durability = self.get_durability(kw)
+        self.sync_files = self.durability in ('file', 'safe')
+        self.sync_directories = self.durability == 'safe'
+        self.precreate_directories = self.get_setting(kw, 'precreate_directories', 'STATIC_GENERATOR_PRECREATE_DIRECTORIES', False)
+        self.dependencies = self.get_index_setting(kw, 'dependency_index', 'STATIC_GENERATOR_DEPENDENCY_INDEX', DependencyIndex)
+        self.published = self.get_index_setting(kw, 'index', 'STATIC_GENERATOR_INDEX', PublishedIndex)
+        self.compressors = self.get_compressors(kw)
+        self.compress_level = self.get_setting(kw, 'compress_level', 'STATIC_GENERATOR_COMPRESS_LEVEL')
+        self.compress_min_size = self.get_setting(kw, 'compress_min_size', 'STATIC_GENERATOR_COMPRESS_MIN_SIZE', 256)
+        self.errors = []
+        self.hooks = self.get_hooks(kw)
+        self.queue_size = self.get_setting(kw, 'queue_size', 'STATIC_GENERATOR_QUEUE_SIZE', 1000)
+        self.queue_timeout = self.get_setting(kw, 'queue_timeout', 'STATIC_GENERATOR_QUEUE_TIMEOUT', 0)
+        self.writer = None
+        self.concurrency = self.get_setting(kw, 'concurrency', 'STATIC_GENERATOR_CONCURRENCY', 100)
+        self._local = threading.local()
+        self.target_errors = []
+        self.target_pool = None
+        self.keep_generations = self.get_setting(kw, 'generations', 'STATIC_GENERATOR_GENERATIONS', 3)
+        self.link_root = None
+        self.trust_index = True
+        self.run_started = None
+        self.render_cache = self.get_render_cache(kw)
+        self.targets = self.get_targets()
 
     def parse_dependencies(self, kw):
         site = kw.get('site', None)
         self.site = site
 
+    def get_setting(self, kw, key, setting, default=None):
+        """
+        Looks for an option passed to the constructor first, then in the
+        django settings and finally in the 'settings' dependency.
+        """
+        if key in kw:
+            return kw[key]
+
+        try:
+            return getattr(settings, setting)
+        except AttributeError:
+            return getattr(kw.get('settings'), setting, default)
+
+    def get_resolved(self, kw, key, resolve, fallback=None):
+        """
+        Returns resolve(kw). When it only depends on the django settings
+        (no 'settings' or 'site' dependency given), the result is cached for
+        every StaticGenerator of the process, until clear_resolved is called
+        by a setting_changed signal or a change to a Site. The fallback value
+        resolve returns when nothing is configured (yet) isn't cached.
+        """
+        if 'settings' in kw or 'site' in kw:
+            return resolve(kw)
+
+        try:
+            return _resolved[key]
+        except KeyError:
+            value = resolve(kw)
+            if value != fallback:
+                _resolved[key] = value
+            return value
+
+    def get_executor(self, kw):
+        executor = self.get_setting(kw, 'executor', 'STATIC_GENERATOR_EXECUTOR', 'serial')
+        workers = self.get_setting(kw, 'workers', 'STATIC_GENERATOR_WORKERS')
+
+        if isinstance(executor, basestring):
+            try:
+                executor = EXECUTORS[executor](workers)
+            except KeyError:
+                raise StaticGeneratorException('Unknown executor: %s' % executor)
+
+        return executor
+
+    def get_storage(self, kw):
+        """
+        Returns the storage the files are written to: 'filesystem' (the
+        default), 'memory' or a storage instance, see staticgenerator.storage.
+        Storages with a root attribute left to None get the web root.
+        """
+        storage = self.get_setting(kw, 'storage', 'STATIC_GENERATOR_STORAGE', 'filesystem')
+
+        if isinstance(storage, basestring):
+            try:
+                storage = STORAGES[storage]()
+            except KeyError:
+                raise StaticGeneratorException('Unknown storage: %s' % storage)
+
+        if getattr(storage, 'root', False) is None:
+            storage.root = self.web_root
+
+        return storage
+
+    def get_render_cache(self, kw):
+        """
+        Returns the RenderCache of the content published recently, shared
+        by the process, or None when STATIC_GENERATOR_RENDER_CACHE_SIZE (in
+        bytes) isn't set.
+        """
+        if 'render_cache' in kw:
+            return kw['render_cache']
+
+        size = self.get_setting(kw, 'render_cache_size', 'STATIC_GENERATOR_RENDER_CACHE_SIZE')
+        if not size:
+            return None
+
+        return get_cache(size, self.get_setting(kw, 'render_cache_ttl', 'STATIC_GENERATOR_RENDER_CACHE_TTL', 60))
+
+    def get_durability(self, kw):
+        """
+        Returns the durability level of the writes:
+         - 'fast': nothing is synced to disk (tmpfs caches...)
+         - 'file': the content of every file is synced before it's renamed
+         - 'safe': the directory is synced too, so the rename survives a crash
+        """
+        durability = self.get_setting(kw, 'durability', 'STATIC_GENERATOR_DURABILITY', 'fast')
+
+        if durability not in DURABILITY_LEVELS:
+            raise StaticGeneratorException('Unknown durability: %s' % durability)
+
+        return durability
+
+    def get_compressors(self, kw):
+        """
+        Returns the (extension, compress) pairs of the variants to publish.
+        Optional compressors (brotli) are skipped when not installed.
+        """
+        compressors = []
+
+        for name in self.get_setting(kw, 'compress', 'STATIC_GENERATOR_COMPRESS', ()):
+            if name in COMPRESSORS:
+                compressors.append(COMPRESSORS[name])
+            elif name not in OPTIONAL_COMPRESSORS:
+                raise StaticGeneratorException('Unknown compression: %s' % name)
+
+        return compressors
+
+    def get_hooks(self, kw):
+        """
+        Returns the instrumentation hooks. Hooks given as dotted paths are
+        imported, and instantiated when they are classes.
+        """
+        hooks = []
+
+        for hook in self.get_setting(kw, 'hooks', 'STATIC_GENERATOR_HOOKS', ()):
+            if isinstance(hook, basestring):
+                module, attr = hook.rsplit('.', 1)
+                hook = getattr(import_module(module), attr)
+                if isinstance(hook, type):
+                    hook = hook()
+            hooks.append(hook)
+
+        return hooks
+
+    def instrument(self, phase, path, start, size=0):
+        """Reports the time spent since start on phase of path to the hooks"""
+        seconds = time.time() - start
+        for hook in self.hooks:
+            hook(phase, path, seconds, size)
+
+    def get_index_setting(self, kw, key, setting, index_class):
+        """
+        Returns the index set, opening the index_class of a file name. The
+        indexes of the settings describe the files of WEB_ROOT, so other
+        storages only get the index passed to the constructor, if any.
+        """
+        if key in kw or isinstance(self.storage, FileSystemStorage):
+            index = self.get_setting(kw, key, setting)
+        else:
+            index = None
+
+        if isinstance(index, basestring):
+            index = get_index(index_class, index)
+
+        return index
+
+    def get_targets(self):
+        """
+        Returns a copy of the generator for each of web_roots, which the
+        pages are written to, or None when there's a single web root.
+        """
+        if not self.web_roots:
+            return None
+
+        targets = [self.copy_for(web_root) for web_root in self.web_roots]
+
+        # The published index has one entry per path for all the web roots,
+        # so its digest doesn't tell what each of them holds.
+        for target in targets:
+            target.trust_index = False
+
+        return targets
+
+    def copy_for(self, web_root):
+        """Returns a copy of the generator writing to web_root"""
+        generator = copy.copy(self)
+        generator.web_root = web_root
+        generator.web_roots = generator.targets = None
+        generator.directories = Directories(self.directories.size)
+        generator.errors = []
+        generator.target_errors = []
+        generator.writer = None
+        generator.render_cache = None
+        return generator
+
+    def fan_out(self, name, path, **kw):
+        """
+        Calls the name method of every target with path, in parallel, and
+        returns the results of those that succeeded. The failures are kept
+        in target_errors as (web_root, path, error) tuples, the first one is
+        only raised when every target failed.
+        """
+        if self.target_pool is None:
+            self.target_pool = ThreadPool(len(self.targets))
+
+        def call(target):
+            return target.call(lambda path: getattr(target, name)(path, **kw), path)
+
+        results = []
+        errors = []
+        for target, (path, result, error) in zip(self.targets, self.target_pool.map(call, self.targets)):
+            if error is None:
+                results.append(result)
+            else:
+                errors.append((target.web_root, path, error))
+
+        self.target_errors.extend(errors)
+        if not results:
+            raise errors[0][2]
+
+        return results
+
     def get_web_root(self, kw):
         try:
             return getattr(settings, 'WEB_ROOT')
@@ -70,19 +475,35 @@ class StaticGenerator(object):
             return web_root
 
     def extract_resources(self, resources):
-        """Takes a list of resources, and gets paths by type"""
-        extracted = []
+        """
+        Takes a list of resources, and lazily yields paths by type.
+        When a shard (index, count) was given, only the paths of that shard
+        are yielded (see get_shard).
+        """
+        paths = self.extract_paths(resources)
 
+        if self.shard is None:
+            return paths
+
+        index, count = self.shard
+        return (path for path in paths if get_shard(path, count) == index)
+
+    def extract_paths(self, resources):
+        """
+        Yields the paths of the resources by type. QuerySets are paged
+        through in chunks (see iter_queryset), so paths are published while
+        the rest of the table is still being read.
+        """
         for resource in resources:
 
             # A URL string
             if isinstance(resource, (str, unicode, Promise)):
-                extracted.append(str(resource))
+                yield str(resource)
                 continue
 
             # A model instance; requires get_absolute_url method
             if isinstance(resource, Model):
-                extracted.append(resource.get_absolute_url())
+                yield resource.get_absolute_url()
                 continue
 
             # If it's a Model, we get the base Manager
@@ -93,11 +514,35 @@ class StaticGenerator(object):
             if isinstance(resource, Manager):
                 resource = resource.all()
 
-            # Append all paths from obj.get_absolute_url() to list
+            # Yield all paths from obj.get_absolute_url()
             if isinstance(resource, QuerySet):
-                extracted += [obj.get_absolute_url() for obj in resource]
+                for path in self.iter_queryset(resource):
+                    yield path
 
-        return extracted
+    def iter_queryset(self, queryset):
+        """
+        Yields obj.get_absolute_url() for every object in the QuerySet.
+        The QuerySet is read in chunks of self.chunk_size objects ordered by
+        primary key, so at most one chunk is held in memory at a time.
+        Sliced QuerySets can't be filtered and are read with iterator().
+        """
+        if not self.chunk_size or not queryset.query.can_filter():
+            for obj in queryset.iterator():
+                yield obj.get_absolute_url()
+            return
+
+        queryset = queryset.order_by('pk')
+        last_pk = None
+
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            objs = [(obj.pk, obj.get_absolute_url()) for obj in chunk[:self.chunk_size].iterator()]
+
+            for last_pk, path in objs:
+                yield path
+
+            if len(objs) < self.chunk_size:
+                break
 
     def get_server_name(self, kw={}):
         '''Tries to get the server name.
@@ -114,6 +559,8 @@ class StaticGenerator(object):
             if not self.site:
                 from django.contrib.sites.models import Site
                 self.site = Site
+                post_save.connect(clear_resolved, sender=Site, dispatch_uid='staticgenerator.clear_resolved')
+                post_delete.connect(clear_resolved, sender=Site, dispatch_uid='staticgenerator.clear_resolved')
             return self.site.objects.get_current().domain
         except:
             server_name = kw['settings'].SERVER_NAME if kw.has_key('settings') and \
@@ -125,25 +572,51 @@ class StaticGenerator(object):
 
             return server_name
 
+    def get_handler(self):
+        """
+        Returns the (handler, request_factory) pair of the current thread.
+        They are created on first use and kept until the settings change, so
+        the middleware isn't loaded again for every page.
+        """
+        local = self._local
+        if getattr(local, 'settings_version', None) != _settings_version:
+            local.handler = DummyHandler()
+            local.request_factory = RequestFactory()
+            local.settings_version = _settings_version
+
+        return local.handler, local.request_factory
+
     def get_content_from_path(self, path):
         """
         Imitates a basic http request using DummyHandler to retrieve
         resulting output (HTML, XML, whatever)
         """
-        request = RequestFactory().get(path)
+        handler, request_factory = self.get_handler()
+
+        request = request_factory.get(path)
         request.path_info = path
         request.META.setdefault('SERVER_PORT', 80)
         request.META.setdefault('SERVER_NAME', self.server_name)
 
-        handler = DummyHandler()
+        start = time.time() if self.hooks else None
+        keys = start_recording() if self.dependencies is not None else None
         try:
             response = handler(request)
         except Exception, err:
             raise StaticGeneratorException("The requested page(\"%s\") raised an exception. Static Generation failed. Error: %s" % (path, str(err)))
+        finally:
+            if keys is not None:
+                stop_recording(keys)
 
         if int(response.status_code) != 200:
             raise StaticGeneratorException("The requested page(\"%s\") returned http code %d. Static Generation failed." % (path, int(response.status_code)))
 
+        if keys is not None:
+            self.dependencies.set(path, keys)
+
+        if start is not None:
+            self.instrument('render', path, start, len(response.content))
+
         return response.content
 
     def get_filename_from_path(self, path):
@@ -157,54 +630,739 @@ class StaticGenerator(object):
         filename = os.path.join(self.web_root, path.lstrip('/')).encode('utf-8')
         return filename, os.path.dirname(filename)
 
-    def publish_from_path(self, path, content=None):
+    def get_digest(self, content):
+        return hashlib.md5(content).hexdigest()
+
+    def is_unchanged(self, filename, content, path=None, digest=None):
+        """
+        Tells whether filename already holds exactly content. When path is
+        in the published index, its stored digest is compared to digest
+        instead of reading the file. Otherwise the sizes are compared first,
+        so the file is only read when they are the same.
+        """
+        if path is not None and self.published is not None and self.trust_index:
+            published = self.published.get(path)
+            if published is not None:
+                return tuple(published) == (digest, len(content)) and self.storage.exists(filename)
+
+        try:
+            if self.storage.getsize(filename) != len(content):
+                return False
+
+            return self.storage.read(filename) == content
+        except EnvironmentError:
+            return False
+
+    def publish_from_path(self, path, content=None, sync_directory=True, ttl=None):
         """
         Gets filename and content for a path, attempts to create directory if
         necessary, writes to file.
+        Returns False when skip_unchanged is set and the file already had
+        the same content, True otherwise.
+        The file and (unless sync_directory is False) its directory are
+        synced to disk according to the durability level.
+        With a ttl, the file expires (see sweep) ttl seconds from now.
+        With the render cache, a path already published during the current
+        run (see map) isn't rendered again, and content identical to the
+        one published recently isn't written again, if the file exists.
         """
-        filename, directory = self.get_filename_from_path(path)
+        if ttl is not None and self.published is None:
+            raise StaticGeneratorException('You must specify STATIC_GENERATOR_INDEX in settings.py to expire pages')
+
+        entry = self.render_cache.peek(path) if self.render_cache is not None else None
+        cached, cached_at = entry or (None, None)
+        hit = False
+
+        if not content and cached is not None and self.run_started is not None and cached_at >= self.run_started:
+            content = cached
+            hit = True
         if not content:
             content = self.get_content_from_path(path)
 
-        if not os.path.exists(directory):
+        skip = cached is not None and content == cached and self.is_published(path)
+        if self.render_cache is not None:
+            self.render_cache.count(hit or skip)
+        if skip:
+            if self.hooks:
+                self.instrument('skip', path, time.time())
+            return False
+
+        # Rendered once, written to every web root
+        if self.targets is not None:
+            written = any(self.fan_out('publish_from_path', path, content=content,
+                                       sync_directory=sync_directory, ttl=ttl))
+            self.cache_content(path, content)
+            return written
+
+        filename, directory = self.get_filename_from_path(path)
+        start = time.time() if self.hooks else None
+
+        digest = self.get_digest(content) if self.published is not None else None
+        expires = time.time() + ttl if ttl is not None else None
+
+        if self.link_root is not None and self.link_unchanged(filename, directory, content):
+            if self.published is not None:
+                self.published.add(path, digest, len(content), expires)
+            if start is not None:
+                self.instrument('skip', path, start)
+            return False
+
+        if self.skip_unchanged and self.is_unchanged(filename, content, path, digest):
+            self.publish_missing_variants(filename, directory, content)
+            if expires is not None:
+                self.published.add(path, digest, len(content), expires)
+            self.cache_content(path, content)
+            if start is not None:
+                self.instrument('skip', path, start)
+            return False
+
+        if directory not in self.directories:
+            self.ensure_directory(directory)
+
+        self.write_file(filename, directory, content)
+        self.publish_variants(filename, directory, content)
+
+        if self.sync_directories and sync_directory:
+            self.sync_directory(directory)
+
+        if self.published is not None:
+            self.published.add(path, digest, len(content), expires)
+
+        self.cache_content(path, content)
+
+        if start is not None:
+            self.instrument('write', path, start, len(content))
+
+        return True
+
+    def is_published(self, path):
+        """Tells whether the file of path exists, in every web root"""
+        if self.targets is not None:
+            return all(target.is_published(path) for target in self.targets)
+
+        return self.storage.exists(self.get_filename_from_path(path)[0])
+
+    def cache_content(self, path, content):
+        if self.render_cache is not None:
+            self.render_cache.set(path, content)
+
+    def link_unchanged(self, filename, directory, content):
+        """
+        Hard links filename (and its variants) to the same file in
+        link_root, the previous generation, when it has the same content.
+        Returns whether it did.
+        """
+        previous = os.path.join(self.link_root, os.path.relpath(filename, self.web_root))
+
+        try:
+            if os.stat(previous).st_size != len(content):
+                return False
+            with open(previous, 'rb') as f:
+                if f.read() != content:
+                    return False
+        except EnvironmentError:
+            return False
+
+        if directory not in self.directories:
+            self.ensure_directory(directory)
+
+        try:
+            os.link(previous, filename)
+        except OSError:
+            return False
+
+        for extension, compress in self.compressors:
             try:
-                os.makedirs(directory)
+                os.link(previous + extension, filename + extension)
+            except OSError:
+                if len(content) >= self.compress_min_size:
+                    self.write_file(filename + extension, directory, compress(content, self.compress_level))
+
+        return True
+
+    def ensure_directory(self, directory):
+        """
+        Creates directory if necessary. The directories already ensured are
+        remembered in self.directories, so it's only checked once.
+        """
+        if not self.storage.exists(directory):
+            try:
+                self.storage.makedirs(directory)
+            except OSError, err:
+                # Created meanwhile by another thread or process
+                if err.errno != errno.EEXIST:
+                    raise StaticGeneratorException('Could not create the directory: %s' % directory)
             except:
                 raise StaticGeneratorException('Could not create the directory: %s' % directory)
 
+        self.directories.add(directory)
+
+    def ensure_directories(self, paths):
+        """Creates the directories of all the paths in one pass"""
+        if self.targets is not None:
+            paths = list(paths)
+            for target in self.targets:
+                target.ensure_directories(paths)
+            return
+
+        directories = set(self.get_filename_from_path(path)[1] for path in paths)
+
+        for directory in sorted(directories):
+            if directory not in self.directories:
+                self.ensure_directory(directory)
+
+    def write_file(self, filename, directory, content):
+        """Atomically writes content to filename, through a temporary file"""
         try:
-            f, tmpname = tempfile.mkstemp(dir=directory)
-            os.write(f, content)
-            os.close(f)
-            os.chmod(tmpname, stat.S_IREAD | stat.S_IWRITE | stat.S_IWUSR | stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
-            os.rename(tmpname, filename)
+            try:
+                self.storage.write(filename, directory, content, self.sync_files)
+            except OSError, err:
+                # The directory was removed since it was ensured
+                if err.errno != errno.ENOENT:
+                    raise
+                self.directories.discard(directory)
+                self.ensure_directory(directory)
+                self.storage.write(filename, directory, content, self.sync_files)
         except:
             raise StaticGeneratorException('Could not create the file: %s' % filename)
 
+    def sync_directory(self, directory):
+        """Syncs the entries of directory (created or renamed files) to disk"""
+        try:
+            self.storage.sync_directory(directory)
+        except EnvironmentError:
+            raise StaticGeneratorException('Could not sync the directory: %s' % directory)
+
+    def publish_variants(self, filename, directory, content):
+        """
+        Writes the pre-compressed variants of filename (index.html.gz, ...)
+        next to it. Content smaller than compress_min_size isn't compressed
+        and any stale variant is removed instead.
+        """
+        for extension, compress in self.compressors:
+            variant = filename + extension
+
+            if len(content) < self.compress_min_size:
+                self.delete_variant(variant)
+                continue
+
+            self.write_file(variant, directory, compress(content, self.compress_level))
+
+    def publish_missing_variants(self, filename, directory, content):
+        """
+        Writes the variants of the unchanged filename that don't exist, as
+        when compression was enabled since it was published.
+        """
+        if len(content) < self.compress_min_size:
+            return
+
+        for extension, compress in self.compressors:
+            variant = filename + extension
+            if not self.storage.exists(variant):
+                self.write_file(variant, directory, compress(content, self.compress_level))
+
+    def delete_variant(self, variant):
+        try:
+            self.storage.discard(variant)
+        except EnvironmentError:
+            # The variant was never written
+            pass
+
     def delete_from_path(self, path):
-        """Deletes file, attempts to delete directory"""
+        """Deletes file and its compressed variants, attempts to delete directory"""
+        if self.render_cache is not None:
+            self.render_cache.discard(path)
+
+        if self.targets is not None:
+            self.fan_out('delete_from_path', path)
+            return
+
+        start = time.time() if self.hooks else None
         filename, directory = self.get_filename_from_path(path)
         try:
-            if os.path.exists(filename):
-                os.remove(filename)
+            if self.storage.exists(filename):
+                self.storage.remove(filename)
         except:
             raise StaticGeneratorException('Could not delete file: %s' % filename)
 
+        for extension in VARIANT_EXTENSIONS:
+            self.delete_variant(filename + extension)
+
+        if self.dependencies is not None:
+            self.dependencies.remove(path)
+
+        if self.published is not None:
+            self.published.remove(path)
+
         try:
-            os.rmdir(directory)
-        except OSError:
+            self.storage.rmdir(directory)
+            self.directories.discard(directory)
+        except EnvironmentError:
             # Will fail if a directory is not empty, in which case we don't
             # want to delete it anyway
             pass
 
+        if start is not None:
+            self.instrument('delete', path, start)
+
+    def invalidate_path(self, path):
+        """
+        Deletes the file of path and its compressed variants with a single
+        unlink each. A missing file is not an error. Unlike delete_from_path,
+        the directory is left in place.
+        """
+        if self.render_cache is not None:
+            self.render_cache.discard(path)
+
+        if self.targets is not None:
+            self.fan_out('invalidate_path', path)
+            return
+
+        filename = self.get_filename_from_path(path)[0]
+
+        # Every variant, as compression may have been disabled since publishing
+        for name in [filename] + [filename + extension for extension in VARIANT_EXTENSIONS]:
+            try:
+                self.storage.discard(name)
+            except EnvironmentError:
+                raise StaticGeneratorException('Could not delete file: %s' % name)
+
+        if self.published is not None:
+            self.published.remove(path)
+
+    def invalidate_prefix(self, prefix):
+        """
+        Deletes everything published under prefix: '/blog/2024/' removes the
+        whole directory, '/blog/20' every entry of /blog/ starting with '20'.
+        Directories are renamed away first so they disappear at once, then
+        removed.
+        """
+        if self.render_cache is not None:
+            self.render_cache.discard_prefix(prefix)
+
+        if self.targets is not None:
+            self.fan_out('invalidate_prefix', prefix)
+            return
+
+        if self.published is not None:
+            self.published.remove_glob(escape_glob(prefix) + '*')
+
+        directory, name = os.path.split(os.path.join(self.web_root, prefix.lstrip('/')).encode('utf-8'))
+
+        if not name and os.path.normpath(directory) != os.path.normpath(self.web_root):
+            self.remove_tree(directory)
+        else:
+            try:
+                entries = self.storage.listdir(directory)
+            except EnvironmentError:
+                raise StaticGeneratorException('Could not list the directory: %s' % directory)
+
+            for entry in entries:
+                if entry.startswith(name):
+                    self.remove_tree(os.path.join(directory, entry))
+
+        self.directories.clear()
+
+    def invalidate_glob(self, pattern):
+        """
+        Deletes the files of the paths in the published index matching the
+        GLOB pattern, as in '/blog/*/comments/'. Returns those paths.
+        """
+        if self.published is None:
+            raise StaticGeneratorException('Set STATIC_GENERATOR_INDEX to invalidate paths by pattern')
+
+        paths = self.published.glob(pattern)
+        for path in paths:
+            self.invalidate_path(path)
+
+        return paths
+
+    def sweep(self, now=None):
+        """
+        Deletes the files of the paths in the published index that expired
+        (published with a ttl) and returns those paths.
+        """
+        if self.published is None:
+            raise StaticGeneratorException('Set STATIC_GENERATOR_INDEX to sweep expired paths')
+
+        paths = self.published.expired(now)
+        for path in paths:
+            self.invalidate_path(path)
+
+        return paths
+
+    def remove_tree(self, name):
+        """Removes the file or directory name, if it exists"""
+        try:
+            self.storage.remove_tree(name)
+        except EnvironmentError:
+            raise StaticGeneratorException('Could not delete file: %s' % name)
+
+    def republish_from_path(self, path):
+        """
+        Publishes path again, or deletes it when it can't be rendered any
+        more (the object it displayed was deleted or unpublished...).
+        The render cache is bypassed, as the page is expected to change.
+        """
+        if self.render_cache is not None:
+            self.render_cache.discard(path)
+
+        try:
+            return self.publish_from_path(path)
+        except StaticGeneratorException:
+            self.delete_from_path(path)
+            return False
+
+    def get_writer(self):
+        """Returns the BackgroundWriter of the generator, created on first use"""
+        if self.writer is None:
+            self.writer = BackgroundWriter(self, maxsize=self.queue_size, timeout=self.queue_timeout)
+        return self.writer
+
+    def refresh_from_path(self, path):
+        """
+        Queues path to be published again by the background writer. The
+        current file is served until the new one is renamed over it, or
+        deleted if the page can't be rendered any more. When the queue is
+        full, the file is deleted right away rather than left stale.
+
+        Inside a managed transaction, the writer wouldn't see the changes
+        yet: path is only queued by flush_refreshes(), once the request
+        finished or when called after the commit.
+        """
+        if transaction.is_managed():
+            if not hasattr(_deferred, 'refreshes'):
+                _deferred.refreshes = []
+            _deferred.refreshes.append((self, path))
+            return
+
+        if not self.get_writer().put(path, None):
+            self.delete_from_path(path)
+
+    def refresh(self):
+        """Refreshes every resource, see refresh_from_path"""
+        for path in self.resources:
+            self.refresh_from_path(path)
+
+    def publish_dependents(self, instance, created=False, deleted=False):
+        """
+        Publishes again the pages recorded in the dependency index as having
+        displayed instance. For a created or deleted instance, the pages that
+        listed objects of its model are published again too.
+        """
+        if self.dependencies is None:
+            raise StaticGeneratorException('You must specify STATIC_GENERATOR_DEPENDENCY_INDEX in settings.py')
+
+        keys = [get_instance_key(instance)]
+        if created or deleted:
+            keys.append(get_model_key(type(instance)))
+
+        self.resources = self.dependencies.get_paths(keys)
+        return self.do_all(self.republish_from_path)
+
+    def call(self, func, path):
+        """
+        Calls func(path) and returns a (path, result, error) tuple, so that a
+        failing path can be collected instead of aborting the whole batch.
+        """
+        try:
+            return path, func(path), None
+        except StaticGeneratorException, err:
+            return path, None, err
+
+    def map(self, func, paths, executor=None):
+        """
+        Runs func for every path using executor (the configured one by
+        default), and yields (path, result, error) tuples. Failures are
+        collected in self.errors when collect_errors is set, otherwise the
+        first one is raised.
+        """
+        self.run_started = time.time()
+        mapped = (executor or self.executor).map(self, func, paths)
+        try:
+            for path, result, error in mapped:
+                if error is not None:
+                    if not self.collect_errors:
+                        raise error
+                    self.errors.append((path, error))
+
+                yield path, result, error
+        finally:
+            mapped.close()
+
+    def done(self):
+        """
+        Calls the hooks having a done method, stops the target threads and
+        ends the run.
+        """
+        self.run_started = None
+
+        if self.target_pool is not None:
+            self.target_pool.close()
+            self.target_pool = None
+
+        for hook in self.hooks:
+            if hasattr(hook, 'done'):
+                hook.done(self)
+
     def do_all(self, func):
-        return [func(path) for path in self.resources]
+        """
+        Runs func for every resource, see map. The hooks having a done
+        method are called at the end.
+        """
+        self.errors = []
+
+        try:
+            return [result for path, result, error in self.map(func, self.resources)]
+        finally:
+            self.done()
+
+    def publish_batched(self):
+        """
+        Renders the resources with the executor and writes them batch_size
+        pages at a time, grouped by directory and sorted by file name, so
+        every directory is written in one go. With the 'safe' durability,
+        each directory is synced once per batch instead of once per file.
+        """
+        self.errors = []
+        results = []
+        rendered = self.map(self.get_content_from_path, self.resources)
+
+        try:
+            while True:
+                batch = list(islice(rendered, self.batch_size))
+                if not batch:
+                    break
+
+                written = self.write_batch([(path, content) for path, content, error in batch if error is None])
+                results.extend(written.get(path) for path, content, error in batch)
+        finally:
+            # Stops the executor's pool when a write failed
+            rendered.close()
+            self.done()
+
+        return results
+
+    def write_batch(self, pages):
+        """
+        Writes (path, content) pages grouped by directory. Returns a dict of
+        the publish_from_path result of every path. The published index is
+        updated in a single transaction.
+        """
+        files = []
+        for path, content in pages:
+            filename, directory = self.get_filename_from_path(path)
+            files.append((directory, filename, path, content))
+
+        files.sort(key=lambda file: file[:2])
+        written = {}
+
+        # Every web root syncs its own directories, once per file
+        fan_out = self.targets is not None
+
+        with self.batch_index():
+            for directory, group in groupby(files, key=lambda file: file[0]):
+                for directory, filename, path, content in group:
+                    try:
+                        written[path] = self.publish_from_path(path, content, sync_directory=fan_out)
+                    except StaticGeneratorException, err:
+                        if not self.collect_errors:
+                            raise
+                        self.errors.append((path, err))
+
+                if self.sync_directories and not fan_out:
+                    self.sync_directory(directory)
+
+        return written
+
+    @contextmanager
+    def batch_index(self):
+        """
+        Groups the published index writes of the current thread in a single
+        transaction (see SQLiteIndex.batch).
+        """
+        if self.published is None:
+            yield
+        else:
+            with self.published.batch():
+                yield
+
+    def publish_pipelined(self, concurrency):
+        """
+        Renders up to concurrency resources at once in a pool of threads,
+        while a single thread writes the rendered pages, so renders waiting
+        on I/O never wait for the disk too. Returns the results like
+        publish().
+        """
+        self.errors = []
+        pages = Queue(maxsize=concurrency)
+        written = {}
+        failures = []
+
+        def write_page(path, content):
+            if failures:
+                return
+
+            try:
+                written[path] = self.publish_from_path(path, content)
+            except StaticGeneratorException, err:
+                if not self.collect_errors:
+                    failures.append(err)
+                else:
+                    self.errors.append((path, err))
+            except Exception, err:
+                failures.append(err)
+
+        def write():
+            # The pages already rendered, up to batch_size, are indexed at once.
+            # Whatever fails, the queue is drained up to None so that the
+            # renders never block on it.
+            page = ()
+            while page is not None:
+                page = pages.get()
+                try:
+                    with self.batch_index():
+                        count = 0
+                        while page is not None:
+                            write_page(*page)
+                            count += 1
+                            if self.batch_size and count >= self.batch_size:
+                                break
+                            try:
+                                page = pages.get_nowait()
+                            except Empty:
+                                break
+                except Exception, err:
+                    failures.append(err)
+
+        writer = threading.Thread(target=write, name='staticgenerator-pipeline')
+        writer.start()
+        paths = []
+
+        try:
+            for path, content, error in self.map(self.get_content_from_path, self.resources,
+                                                 ThreadPoolExecutor(concurrency)):
+                paths.append(path)
+                if failures:
+                    break
+                if error is None:
+                    pages.put((path, content))
+        finally:
+            pages.put(None)
+            writer.join()
+            self.done()
+
+        if failures:
+            raise failures[0]
+
+        results = [written.get(path) for path in paths]
+        self.set_stats(results)
+        return results
+
+    def publish_generation(self):
+        """
+        Publishes every resource into a new generation of the web root (see
+        staticgenerator.generations), where the files identical to those
+        of the current generation are hard links to them. When every page
+        was published, the web root symlink is atomically switched to it
+        and the older generations are pruned; otherwise it's removed.
+        The published index is built aside, and replaces self.published
+        once the generation is switched in. Returns the results like
+        publish().
+        """
+        if not isinstance(self.storage, FileSystemStorage):
+            raise StaticGeneratorException('Generations need the filesystem storage')
+        if self.web_roots:
+            raise StaticGeneratorException('Generations can not be used with STATIC_GENERATOR_WEB_ROOTS')
+
+        generations = Generations(self.web_root, self.keep_generations)
+        try:
+            generations.check()
+            generation = generations.create()
+        except EnvironmentError, err:
+            raise StaticGeneratorException('Could not create a generation: %s' % err)
+
+        builder = self.copy_for(generation)
+        builder.link_root = generations.current()
+        builder.skip_unchanged = False
+
+        index_filename = None
+        if self.published is not None:
+            f, index_filename = tempfile.mkstemp(suffix='.db')
+            os.close(f)
+            builder.published = PublishedIndex(index_filename)
+
+        try:
+            try:
+                results = builder.publish()
+                if builder.errors:
+                    raise StaticGeneratorException('%d paths could not be published' % len(builder.errors))
+            except:
+                shutil.rmtree(generation, ignore_errors=True)
+                raise
+            finally:
+                self.errors = builder.errors
+                self.stats = builder.stats
+
+            try:
+                generations.activate(generation)
+            except EnvironmentError:
+                shutil.rmtree(generation, ignore_errors=True)
+                raise StaticGeneratorException('Could not switch the web root to %s' % generation)
+
+            if index_filename is not None:
+                self.published.replace(builder.published)
+        finally:
+            if index_filename is not None:
+                os.remove(index_filename)
+
+        generations.prune()
+        return results
+
+    def apublish(self, concurrency=None):
+        """
+        Starts publishing every resource in the background (see
+        publish_pipelined) and returns a multiprocessing AsyncResult, whose
+        get() waits for the results or raises the error.
+        """
+        pool = ThreadPool(1)
+        result = pool.apply_async(self.publish_pipelined, (concurrency or self.concurrency,))
+        pool.close()
+        return result
 
     def delete(self):
         return self.do_all(self.delete_from_path)
 
+    def close(self):
+        """Closes the storage, which completes archives"""
+        try:
+            self.storage.close()
+        except EnvironmentError:
+            raise StaticGeneratorException('Could not complete the storage')
+
     def publish(self):
-        return self.do_all(self.publish_from_path)
+        """
+        Publishes every resource. The number of files written and skipped
+        because they were unchanged is kept in self.stats.
+        With precreate_directories, all the directories are created first,
+        which reads the resources twice.
+        """
+        if self.precreate_directories:
+            self.ensure_directories(self.resources)
+
+        if self.batch_size:
+            results = self.publish_batched()
+        else:
+            results = self.do_all(self.publish_from_path)
+
+        self.set_stats(results)
+        return results
+
+    def set_stats(self, results):
+        self.stats = {
+            'written': results.count(True),
+            'skipped': results.count(False),
+        }
 
 
 def quick_publish(*resources):
@@ -213,3 +1371,80 @@ def quick_publish(*resources):
 
 def quick_delete(*resources):
     return StaticGenerator(*resources).delete()
+
+
+def quick_refresh(*resources):
+    """
+    Refreshes resources in the background instead of deleting them, see
+    StaticGenerator.refresh_from_path. The generator, and so its writer
+    thread and queue, is shared by every call.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = StaticGenerator()
+
+    for path in _refresher.extract_resources(resources):
+        _refresher.refresh_from_path(path)
+
+
+def flush_refreshes(**kw):
+    """
+    Queues the refreshes deferred by the current thread until its
+    transaction was committed (see StaticGenerator.refresh_from_path).
+    Called when a request finished; call it after committing outside of
+    requests.
+    """
+    refreshes, _deferred.refreshes = getattr(_deferred, 'refreshes', []), []
+
+    for generator, path in refreshes:
+        if not generator.get_writer().put(path, None):
+            generator.delete_from_path(path)
+
+request_finished.connect(flush_refreshes, dispatch_uid='staticgenerator.flush_refreshes')
+
+
+def quick_invalidate(*paths, **kw):
+    """
+    Deletes the files of paths, everything under the path prefixes given as
+    prefixes=(...) and the published paths matching the patterns given as
+    globs=(...), without rendering or extracting any resource::
+
+        quick_invalidate('/', '/blog/', prefixes=('/blog/2024/',), globs=('/*/feed/',))
+    """
+    prefixes = kw.pop('prefixes', ())
+    globs = kw.pop('globs', ())
+    generator = StaticGenerator(**kw)
+
+    for path in paths:
+        generator.invalidate_path(path)
+
+    for prefix in prefixes:
+        generator.invalidate_prefix(prefix)
+
+    for pattern in globs:
+        generator.invalidate_glob(pattern)
+
+
+def publish_dependents(sender, instance, created=False, **kw):
+    """
+    post_save and post_delete receiver, see connect_dependencies. Objects
+    saved while a page is rendered are ignored.
+    """
+    if is_recording():
+        return None
+    return StaticGenerator().publish_dependents(instance, created, deleted=kw.get('signal') is post_delete)
+
+
+def connect_dependencies(*models):
+    """
+    Publishes again the pages that depend on the objects of models when
+    they are saved or deleted.
+    Requires settings.STATIC_GENERATOR_DEPENDENCY_INDEX.
+    """
+    if not models:
+        raise StaticGeneratorException('You must give the models whose objects the pages display')
+
+    for model in models:
+        post_save.connect(publish_dependents, sender=model)
+        post_delete.connect(publish_dependents, sender=model)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""In-process cache of the pages rendered or published recently."""
+from collections import OrderedDict
+
+import threading
+import time
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(max_bytes, ttl):
+    """Returns the RenderCache of max_bytes and ttl, shared by the process"""
+    with _caches_lock:
+        key = (max_bytes, ttl)
+        if key not in _caches:
+            _caches[key] = RenderCache(max_bytes, ttl)
+        return _caches[key]
+
+
+class RenderCache(object):
+    """
+    LRU cache of the content last published for every path, holding up to
+    max_bytes of content. Entries expire ttl seconds after being set.
+    """
+
+    def __init__(self, max_bytes, ttl=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, since=None):
+        """
+        Returns the content cached for path, or None. With since, only
+        content set after that timestamp is returned.
+        """
+        entry = self.peek(path)
+        hit = entry is not None and (since is None or entry[1] >= since)
+        self.count(hit)
+        return entry[0] if hit else None
+
+    def peek(self, path):
+        """
+        Returns the (content, created) cached for path, or None, without
+        counting a hit or a miss.
+        """
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is None:
+                return None
+
+            if entry[2] <= time.time():
+                self.size -= len(entry[0])
+                return None
+
+            self.entries[path] = entry
+            return entry[:2]
+
+    def count(self, hit):
+        """Counts a lookup as a hit when the cached content was used, a miss otherwise"""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, path, content):
+        with self.lock:
+            self.remove(path)
+            if len(content) > self.max_bytes:
+                return
+
+            now = time.time()
+            self.entries[path] = (content, now, now + self.ttl)
+            self.size += len(content)
+
+            while self.size > self.max_bytes:
+                path, (content, created, expires) = self.entries.popitem(last=False)
+                self.size -= len(content)
+
+    def discard(self, path):
+        with self.lock:
+            self.remove(path)
+
+    def discard_prefix(self, prefix):
+        with self.lock:
+            for path in [path for path in self.entries if path.startswith(prefix)]:
+                self.remove(path)
+
+    def remove(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes': self.size,
+            }
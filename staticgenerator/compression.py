@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Pre-compressed variants written next to the published files."""
+from cStringIO import StringIO
+
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(content, level=None):
+    buf = StringIO()
+    # mtime=0 keeps the output stable for the same content
+    f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9 if level is None else level, mtime=0)
+    f.write(content)
+    f.close()
+    return buf.getvalue()
+
+
+def brotli_compress(content, level=None):
+    return brotli.compress(content, quality=11 if level is None else level)
+
+
+# name: (extension, compress function)
+COMPRESSORS = {
+    'gzip': ('.gz', gzip_compress),
+}
+
+if brotli is not None:
+    COMPRESSORS['brotli'] = ('.br', brotli_compress)
+
+# Compressors that are silently skipped when their module isn't installed
+OPTIONAL_COMPRESSORS = ('brotli',)
+
+# Every variant that may exist next to a file, removed along with it
+VARIANT_EXTENSIONS = ('.gz', '.br')
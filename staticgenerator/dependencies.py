@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Records which model instances are loaded while a page is rendered.
+
+Every instance coming from the database is recorded as
+'app_label.model:pk', so changing it republishes the page. Every query
+listing objects is recorded as the 'app_label.model' of the tables it
+reads, even when it loads no instance (count(), values(), no rows...), so
+creating or deleting an object of those models republishes the page.
+Lookups of a single object by primary key or unique field (get(pk=...))
+only record the instance.
+"""
+from django.db.models import get_models
+from django.db.models.signals import post_init
+from django.db.models.sql.compiler import SQLCompiler, SQLDeleteCompiler, SQLInsertCompiler, SQLUpdateCompiler
+
+import threading
+
+_recording = threading.local()
+_connected = False
+_connect_lock = threading.Lock()
+_models_by_table = None
+
+
+def get_model_key(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.object_name.lower())
+
+
+def get_instance_key(instance):
+    return '%s:%s' % (get_model_key(type(instance)), instance.pk)
+
+
+def get_model_for_table(table):
+    """Returns the model stored in the database table, or None"""
+    global _models_by_table
+    if _models_by_table is None:
+        _models_by_table = dict((model._meta.db_table, model) for model in get_models(include_auto_created=True))
+    return _models_by_table.get(table)
+
+
+def is_recording():
+    """Tells whether the current thread is recording, i.e. rendering a page"""
+    return bool(getattr(_recording, 'stack', None))
+
+
+def _record(*keys):
+    for recorded in getattr(_recording, 'stack', None) or ():
+        recorded.update(keys)
+
+
+def is_single_lookup(query):
+    """
+    Tells whether query selects at most one object of its model, through an
+    exact lookup on its primary key or a unique field.
+    """
+    if query.model is None:
+        return False
+
+    nodes = [query.where]
+    while nodes:
+        node = nodes.pop()
+        if node.negated or (node.connector != 'AND' and len(node.children) > 1):
+            continue
+
+        for child in node.children:
+            if isinstance(child, tuple):
+                constraint, lookup_type = child[:2]
+                field = getattr(constraint, 'field', None)
+                if lookup_type == 'exact' and field is not None and (field.primary_key or field.unique) \
+                        and constraint.alias == query.model._meta.db_table:
+                    return True
+            elif hasattr(child, 'children'):
+                nodes.append(child)
+
+    return False
+
+
+def _record_instance(sender, instance, **kw):
+    # Objects without a primary key weren't loaded from the database
+    if instance.pk is not None and is_recording():
+        _record(get_instance_key(instance))
+
+
+def _record_query(compiler):
+    if isinstance(compiler, (SQLDeleteCompiler, SQLInsertCompiler, SQLUpdateCompiler)):
+        return
+    if is_single_lookup(compiler.query):
+        return
+
+    models = [compiler.query.model] + [get_model_for_table(table) for table in compiler.query.table_map]
+    _record(*set(get_model_key(model) for model in models if model is not None))
+
+
+def _execute_sql(execute_sql):
+    def wrapper(self, *args, **kw):
+        if is_recording():
+            _record_query(self)
+        return execute_sql(self, *args, **kw)
+    return wrapper
+
+
+def start_recording():
+    """
+    Starts recording the instances and the models queried by the current
+    thread, and returns the set the keys are added to. Recordings can be
+    nested: the keys go to every recording in progress.
+    """
+    global _connected
+    with _connect_lock:
+        if not _connected:
+            post_init.connect(_record_instance, dispatch_uid='staticgenerator.dependencies')
+            SQLCompiler.execute_sql = _execute_sql(SQLCompiler.execute_sql)
+            _connected = True
+
+    keys = set()
+    _recording.stack = getattr(_recording, 'stack', None) or []
+    _recording.stack.append(keys)
+    return keys
+
+
+def stop_recording(keys=None):
+    """
+    Stops the recording returned by start_recording as keys (the innermost
+    one by default) and returns the keys recorded, or None if it wasn't
+    recording.
+    """
+    stack = getattr(_recording, 'stack', None) or []
+    if keys is None:
+        return stack.pop() if stack else None
+
+    for i, recorded in enumerate(stack):
+        if recorded is keys:
+            del stack[i]
+            return keys
+    return None
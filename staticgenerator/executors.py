@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Executors used by StaticGenerator.do_all to run a function over paths."""
+from collections import deque
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+
+
+# Generator of a process pool worker, set by _init_worker. It is passed when
+# the worker forks, so it never has to be pickled.
+_worker_generator = None
+
+# Database connections a worker inherited from the parent process. They are
+# kept referenced (workers exit with os._exit) so they are never closed,
+# which would end the parent's session.
+_inherited_connections = []
+
+
+def _init_worker(generator):
+    global _worker_generator
+    _worker_generator = generator
+
+    from django.db import connections
+    for connection in connections.all():
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            connection.connection = None
+
+
+def _call_in_worker(args):
+    func_name, path = args
+    return _worker_generator.call(getattr(_worker_generator, func_name), path)
+
+
+def imap_bounded(pool, func, items, window):
+    """
+    Like pool.imap(func, items), but items are read in the calling thread
+    and only window of them ahead of the results, so lazy items (QuerySet
+    chunks...) stay lazy.
+    """
+    pending = deque()
+
+    for item in items:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+class SerialExecutor(object):
+    """Runs every path one after another in the current thread"""
+
+    def __init__(self, workers=None):
+        self.workers = 1
+
+    def map(self, generator, func, paths):
+        for path in paths:
+            yield generator.call(func, path)
+
+
+class ThreadPoolExecutor(object):
+    """Runs paths in a pool of threads. Best suited for I/O bound views."""
+
+    def __init__(self, workers=None):
+        self.workers = workers
+
+    def map(self, generator, func, paths):
+        pool = ThreadPool(self.workers)
+        try:
+            for result in imap_bounded(pool, lambda path: generator.call(func, path), paths,
+                                       (self.workers or cpu_count()) * 2):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+class ProcessPoolExecutor(object):
+    """
+    Runs paths in a pool of forked processes. Best suited for CPU bound
+    template rendering. func must be a method of the StaticGenerator.
+    The database connections are closed before forking, and every worker
+    opens its own.
+
+    Within a transaction, closing the connections would roll it back and
+    the workers couldn't see its changes: the paths are run serially in
+    the current process instead.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+
+    def map(self, generator, func, paths):
+        from django.db import connections
+        if any(connection.is_managed() or connection.is_dirty() for connection in connections.all()):
+            for result in SerialExecutor().map(generator, func, paths):
+                yield result
+            return
+
+        for connection in connections.all():
+            connection.close()
+
+        pool = Pool(self.workers, initializer=_init_worker, initargs=(generator,))
+        try:
+            tasks = ((func.__name__, path) for path in paths)
+            for result in imap_bounded(pool, _call_in_worker, tasks, (self.workers or cpu_count()) * 2):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
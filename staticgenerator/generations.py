@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Generations of a web root: complete, versioned copies of the site built
+next to it, the web root being a symlink to the current one.
+"""
+import errno
+import os
+import shutil
+import tempfile
+import time
+
+
+class Generations(object):
+    """
+    The generations of web_root, directories named
+    <web root>.generation-<UTC timestamp>-<suffix> in the same parent
+    directory. The keep newest ones (and the current one) are kept by
+    prune().
+    """
+
+    def __init__(self, web_root, keep=3):
+        self.web_root = os.path.abspath(web_root.rstrip(os.sep))
+        self.parent, self.name = os.path.split(self.web_root)
+        self.prefix = '%s.generation-' % self.name
+        self.keep = keep
+
+    def check(self):
+        """Raises OSError when the web root is a directory, not a symlink"""
+        if os.path.exists(self.web_root) and not os.path.islink(self.web_root):
+            raise OSError(errno.EEXIST, 'The web root must be a symlink to use generations', self.web_root)
+
+    def list(self):
+        """Returns the generations, oldest first"""
+        return [os.path.join(self.parent, name) for name in sorted(os.listdir(self.parent))
+                if name.startswith(self.prefix) and os.path.isdir(os.path.join(self.parent, name))]
+
+    def current(self):
+        """Returns the generation the web root points to, or None"""
+        if not os.path.islink(self.web_root):
+            return None
+        return os.path.join(self.parent, os.readlink(self.web_root))
+
+    def create(self):
+        """Creates a new, empty generation and returns its directory"""
+        now = time.time()
+        prefix = '%s%s%06d-' % (self.prefix, time.strftime('%Y%m%d%H%M%S', time.gmtime(now)), now % 1 * 1000000)
+        generation = tempfile.mkdtemp(prefix=prefix, dir=self.parent)
+        os.chmod(generation, 0755)
+        return generation
+
+    def activate(self, generation):
+        """Atomically points the web root to generation"""
+        link = os.path.join(self.parent, '.%s.%d.link' % (self.name, os.getpid()))
+        if os.path.lexists(link):
+            os.remove(link)
+
+        os.symlink(os.path.basename(generation), link)
+        os.rename(link, self.web_root)
+
+    def rollback(self):
+        """Points the web root back to the generation before the current one"""
+        generations = self.list()
+        current = self.current()
+
+        if current not in generations or generations.index(current) == 0:
+            raise OSError(errno.ENOENT, 'There is no previous generation', self.web_root)
+
+        self.activate(generations[generations.index(current) - 1])
+
+    def prune(self):
+        """Removes all but the keep newest generations and the current one"""
+        current = self.current()
+        generations = self.list()
+
+        for generation in generations[:max(len(generations) - self.keep, 0)]:
+            if generation != current:
+                shutil.rmtree(generation, ignore_errors=True)
@@ -6,10 +6,15 @@ from django.middleware.transaction import TransactionMiddleware
 
 
 class DummyHandler(BaseHandler):
-    """Required to process request and response middleware"""
+    """
+    Required to process request and response middleware.
+    The middleware is loaded once, on the first request.
+    """
 
     def __call__(self, request):
-        self.load_middleware()
+        if self._request_middleware is None:
+            self.load_middleware()
+
         response = self.get_response(request)
 
         for middleware_method in self._response_middleware:
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Indexes kept by StaticGenerator in SQLite databases."""
+from contextlib import contextmanager
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def escape_glob(value):
+    """Escapes the GLOB wildcards of value, so it only matches itself"""
+    return re.sub(r'([*?[])', r'[\1]', value)
+
+
+def get_index(index_class, filename):
+    """Returns the index_class instance of filename, shared by the process"""
+    with _indexes_lock:
+        key = (index_class, filename)
+        if key not in _indexes:
+            _indexes[key] = index_class(filename)
+        return _indexes[key]
+
+
+class SQLiteIndex(object):
+    """
+    Base class of the indexes stored in a SQLite database. Every thread and
+    every (forked) process opens its own connection on first use.
+
+    The database is in WAL mode with synchronous=NORMAL: a commit doesn't
+    wait for an fsync, and readers don't block the writer. The writes of a
+    thread can be grouped in a single transaction with batch().
+    """
+    schema = ()
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        local = self.local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(self.filename, timeout=30)
+            local.connection.text_factory = str
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.execute('PRAGMA synchronous=NORMAL')
+            local.batching = False
+            with local.connection:
+                for statement in self.schema:
+                    local.connection.execute(statement)
+            local.pid = os.getpid()
+
+        return local.connection
+
+    @contextmanager
+    def batch(self):
+        """
+        Commits the writes of the current thread at once, at the end, even
+        when an error interrupted the batch (what was written stays true).
+        """
+        connection = self.connection
+        if self.local.batching:
+            yield
+            return
+
+        self.local.batching = True
+        try:
+            yield
+        finally:
+            self.local.batching = False
+            connection.commit()
+
+    @contextmanager
+    def writing(self):
+        """Returns the connection to write to, committed unless batching"""
+        connection = self.connection
+        if self.local.batching:
+            yield connection
+        else:
+            with connection:
+                yield connection
+
+
+class DependencyIndex(SQLiteIndex):
+    """
+    Keeps which objects (see staticgenerator.dependencies) every published
+    path was rendered from.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS dependencies (key TEXT, path TEXT, PRIMARY KEY (key, path))',
+        'CREATE INDEX IF NOT EXISTS dependencies_path ON dependencies (path)',
+    )
+
+    def set(self, path, keys):
+        """Replaces the dependencies of path"""
+        with self.writing() as connection:
+            connection.execute('DELETE FROM dependencies WHERE path = ?', (path,))
+            connection.executemany('INSERT INTO dependencies (key, path) VALUES (?, ?)',
+                                   [(key, path) for key in keys])
+
+    def remove(self, path):
+        with self.writing() as connection:
+            connection.execute('DELETE FROM dependencies WHERE path = ?', (path,))
+
+    def get_paths(self, keys):
+        """Returns the paths depending on any of keys"""
+        keys = list(keys)
+        if not keys:
+            return []
+
+        cursor = self.connection.execute(
+            'SELECT DISTINCT path FROM dependencies WHERE key IN (%s) ORDER BY path' % ', '.join('?' * len(keys)),
+            keys,
+        )
+        return [path for path, in cursor]
+
+
+class PublishedIndex(SQLiteIndex):
+    """
+    Keeps every path published, with the digest and size of its content,
+    when it was published and when it expires, so the published files can
+    be listed without walking the web root.
+    """
+    schema = (
+        'CREATE TABLE IF NOT EXISTS published '
+        '(path TEXT PRIMARY KEY, digest TEXT, size INTEGER, published REAL, expires REAL)',
+        'CREATE INDEX IF NOT EXISTS published_published ON published (published)',
+        'CREATE INDEX IF NOT EXISTS published_expires ON published (expires)',
+    )
+
+    def add(self, path, digest, size, expires=None):
+        with self.writing() as connection:
+            connection.execute('INSERT OR REPLACE INTO published (path, digest, size, published, expires) '
+                               'VALUES (?, ?, ?, ?, ?)', (path, digest, size, time.time(), expires))
+
+    def remove(self, path):
+        with self.writing() as connection:
+            connection.execute('DELETE FROM published WHERE path = ?', (path,))
+
+    def remove_glob(self, pattern):
+        with self.writing() as connection:
+            connection.execute('DELETE FROM published WHERE path GLOB ?', (pattern,))
+
+    def get(self, path):
+        """Returns the (digest, size) of path, or None if it isn't published"""
+        return self.connection.execute('SELECT digest, size FROM published WHERE path = ?', (path,)).fetchone()
+
+    def glob(self, pattern):
+        """Returns the paths matching the GLOB pattern, as in '/blog/*/comments/'"""
+        cursor = self.connection.execute('SELECT path FROM published WHERE path GLOB ? ORDER BY path', (pattern,))
+        return [path for path, in cursor]
+
+    def prefix(self, prefix):
+        """Returns the paths starting with prefix"""
+        return self.glob(escape_glob(prefix) + '*')
+
+    def stale(self, older_than):
+        """Returns the paths published before the timestamp older_than"""
+        cursor = self.connection.execute('SELECT path FROM published WHERE published < ? ORDER BY path',
+                                         (older_than,))
+        return [path for path, in cursor]
+
+    def replace(self, other):
+        """Replaces every entry with those of the PublishedIndex other"""
+        other.connection  # creates its table, even if nothing was added
+        connection = self.connection
+        connection.execute('ATTACH DATABASE ? AS other', (other.filename,))
+        try:
+            with connection:
+                connection.execute('DELETE FROM published')
+                connection.execute('INSERT INTO published SELECT * FROM other.published')
+        finally:
+            connection.execute('DETACH DATABASE other')
+
+    def expired(self, now=None):
+        """Returns the paths whose expiry timestamp is past now"""
+        cursor = self.connection.execute('SELECT path FROM published WHERE expires <= ? ORDER BY path',
+                                         (time.time() if now is None else now,))
+        return [path for path, in cursor]
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Hooks called by StaticGenerator with the duration of every phase.
+
+A hook is any callable accepting (phase, path, seconds, size), where phase
+is one of PHASES and size is the number of bytes involved. If it has a
+done(generator) method, it's called at the end of every do_all.
+Hooks run where the work is done, so with the 'process' executor they are
+called in the worker processes.
+"""
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger('staticgenerator')
+
+PHASES = ('extract', 'render', 'write', 'skip', 'delete')
+
+# Upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.001, 0.01, 0.1, 1, 10)
+
+
+class Stats(object):
+    """
+    Hook aggregating the totals, the histogram of the durations of every
+    phase and the slowest paths. The report is logged at the end of every
+    do_all.
+    """
+
+    def __init__(self, slowest=10, buckets=BUCKETS):
+        self.buckets = buckets
+        self.slowest_size = slowest
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.histograms = {}
+        self.slowest = []
+
+    def __call__(self, phase, path, seconds, size):
+        with self.lock:
+            total = self.totals.setdefault(phase, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            total['count'] += 1
+            total['seconds'] += seconds
+            total['bytes'] += size
+
+            histogram = self.histograms.setdefault(phase, [0] * (len(self.buckets) + 1))
+            histogram[self.get_bucket(seconds)] += 1
+
+            entry = (seconds, phase, path)
+            if len(self.slowest) < self.slowest_size:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def get_bucket(self, seconds):
+        for index, bound in enumerate(self.buckets):
+            if seconds < bound:
+                return index
+        return len(self.buckets)
+
+    def report(self):
+        """Returns the totals, histograms and slowest (seconds, phase, path)"""
+        with self.lock:
+            labels = ['< %gs' % bound for bound in self.buckets] + ['>= %gs' % self.buckets[-1]]
+            return {
+                'totals': dict((phase, dict(total)) for phase, total in self.totals.items()),
+                'histograms': dict((phase, zip(labels, histogram)) for phase, histogram in self.histograms.items()),
+                'slowest': sorted(self.slowest, reverse=True),
+            }
+
+    def done(self, generator):
+        report = self.report()
+
+        for phase in PHASES:
+            if phase in report['totals']:
+                total = report['totals'][phase]
+                logger.info('%s: %d paths, %.3fs, %d bytes', phase, total['count'], total['seconds'], total['bytes'])
+
+        for seconds, phase, path in report['slowest']:
+            logger.info('slowest: %s %s %.3fs', phase, path, seconds)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Locks making sure a single worker fills the cache of a path at a time."""
+import errno
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Seconds between two attempts to take a file lock held by another process
+POLL_INTERVAL = 0.05
+
+
+def get_lock_filename(directory, filename):
+    """Returns the lock file of filename, named after its hash in directory"""
+    if isinstance(filename, unicode):
+        filename = filename.encode('utf-8')
+    return os.path.join(directory, '%s.lock' % hashlib.md5(filename).hexdigest())
+
+
+class FillLocks(object):
+    """
+    Per-path locks. A path is claimed by one thread of the process, then by
+    one process through an flock on its lock file, so concurrent requests
+    for the same page don't all write it.
+
+    The lock files are kept in directory (staticgenerator-locks in the
+    temporary directory by default), outside of the web root.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'staticgenerator-locks')
+        self.condition = threading.Condition()
+        self.claimed = set()
+
+    def get_lock_filename(self, filename):
+        """Returns the lock file of filename, creating the directory if needed"""
+        try:
+            os.makedirs(self.directory)
+        except OSError, err:
+            if err.errno != errno.EEXIST:
+                raise
+        return get_lock_filename(self.directory, filename)
+
+    def acquire(self, path, lock_filename, timeout=0):
+        """
+        Claims path, waiting up to timeout seconds for whoever holds it.
+        Returns the file descriptor to release, or None if still held.
+        """
+        deadline = time.time() + timeout
+
+        with self.condition:
+            while path in self.claimed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.claimed.add(path)
+
+        try:
+            fd = self.lock_file(lock_filename, deadline)
+        except:
+            self.discard(path)
+            raise
+
+        if fd is None:
+            self.discard(path)
+        return fd
+
+    def lock_file(self, lock_filename, deadline):
+        fd = os.open(lock_filename, os.O_RDWR | os.O_CREAT, 0644)
+
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except IOError, err:
+                if err.errno not in (errno.EAGAIN, errno.EACCES):
+                    os.close(fd)
+                    raise
+
+            if time.time() >= deadline:
+                os.close(fd)
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, path, fd):
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        finally:
+            self.discard(path)
+
+    def discard(self, path):
+        with self.condition:
+            self.claimed.discard(path)
+            self.condition.notify_all()
@@ -0,0 +1,138 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Model, get_model
+from django.db.models.base import ModelBase
+from django.db.models.manager import Manager
+from django.db.models.query import QuerySet
+from django.utils.importlib import import_module
+
+from ... import StaticGenerator, StaticGeneratorException
+from ...executors import ProcessPoolExecutor
+from ...storage import ArchiveStorage
+
+# Resources published as a whole, rather than lists of resources
+SINGLE_RESOURCES = (basestring, Model, ModelBase, Manager, QuerySet)
+
+
+def parse_shard(shard):
+    """Parses 'i/N' into (i, N)"""
+    try:
+        index, count = [int(value) for value in shard.split('/')]
+    except ValueError:
+        raise CommandError('--shard must look like i/N, not %s' % shard)
+
+    if not 0 <= index < count:
+        raise CommandError('The shard index must be between 0 and %d' % (count - 1))
+
+    return index, count
+
+
+def get_resources(names):
+    """
+    Returns the resources named by URL paths ('/about/'), models
+    ('blog.Post') or dotted paths to a resource, a list of resources or a
+    callable returning either ('blog.static.resources'). QuerySets,
+    managers and models are kept as is, to be read lazily by
+    StaticGenerator.
+    """
+    resources = []
+
+    for name in names:
+        if name.startswith('/'):
+            resources.append(name)
+            continue
+
+        if name.count('.') == 1:
+            model = get_model(*name.split('.'))
+            if model is not None:
+                resources.append(model)
+                continue
+
+        module, attr = name.rsplit('.', 1)
+        try:
+            value = getattr(import_module(module), attr)
+        except (ImportError, AttributeError):
+            raise CommandError('Unknown resource: %s' % name)
+
+        if callable(value) and not isinstance(value, SINGLE_RESOURCES):
+            value = value()
+
+        if isinstance(value, SINGLE_RESOURCES):
+            resources.append(value)
+        else:
+            resources.extend(value)
+
+    return resources
+
+
+class Command(BaseCommand):
+    args = '<resource resource ...>'
+    help = ('Publishes resources: URL paths (/about/), models (blog.Post) or dotted paths '
+            'to a list of resources or a callable returning one. '
+            'Defaults to settings.STATIC_GENERATOR_BUILD_RESOURCES.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--shard', dest='shard', default=None,
+                    help='Only publish the paths of shard i out of N (from 0), given as i/N. '
+                         'Paths are split by hash, so N hosts can share a rebuild.'),
+        make_option('--executor', dest='executor', default=None,
+                    help="Executor used to publish: 'serial', 'thread' or 'process'."),
+        make_option('--workers', dest='workers', type='int', default=None,
+                    help='Number of threads or processes.'),
+        make_option('--archive', dest='archive', default=None,
+                    help='Write the pages to a .tar, .tar.gz or .zip archive instead of WEB_ROOT. '
+                         'It is only put in place when every page was published.'),
+        make_option('--generation', dest='generation', action='store_true', default=False,
+                    help='Build a new generation next to WEB_ROOT (a symlink), switched to when '
+                         'every page was published. Keeps STATIC_GENERATOR_GENERATIONS generations.'),
+    )
+
+    def handle(self, *args, **options):
+        names = args or getattr(settings, 'STATIC_GENERATOR_BUILD_RESOURCES', ())
+        if not names:
+            raise CommandError('Give some resources or set STATIC_GENERATOR_BUILD_RESOURCES')
+
+        kw = {'collect_errors': True}
+        if options['shard']:
+            kw['shard'] = parse_shard(options['shard'])
+        if options['executor']:
+            kw['executor'] = options['executor']
+        if options['workers']:
+            kw['workers'] = options['workers']
+        if options['generation'] and (options['archive'] or options['shard']):
+            raise CommandError('--generation can not be used with --archive or --shard')
+        if options['archive']:
+            kw['storage'] = ArchiveStorage(options['archive'])
+
+        generator = StaticGenerator(*get_resources(names), **kw)
+
+        # Also set by settings.STATIC_GENERATOR_EXECUTOR
+        if options['archive'] and isinstance(generator.executor, ProcessPoolExecutor):
+            raise CommandError('Archives can not be written by the process executor')
+
+        if options['generation']:
+            try:
+                generator.publish_generation()
+            except StaticGeneratorException, err:
+                # Failed pages are reported below
+                if not generator.errors:
+                    raise CommandError(str(err))
+        else:
+            generator.publish()
+
+        if options['archive'] and generator.errors:
+            generator.storage.abort()
+        elif options['archive']:
+            generator.close()
+
+        for path, error in generator.errors:
+            self.stderr.write('%s: %s\n' % (path, error))
+
+        if int(options['verbosity']) > 0:
+            self.stdout.write('%d written, %d skipped, %d failed\n' % (
+                generator.stats['written'], generator.stats['skipped'], len(generator.errors)))
+
+        if generator.errors:
+            raise CommandError('%d paths could not be published' % len(generator.errors))
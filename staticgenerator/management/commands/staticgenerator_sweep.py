@@ -0,0 +1,36 @@
+from optparse import make_option
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from staticgenerator import StaticGenerator, StaticGeneratorException
+
+
+class Command(BaseCommand):
+    help = ('Deletes the files of the pages published with a TTL that expired, '
+            'as recorded in settings.STATIC_GENERATOR_INDEX.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--every', dest='every', type='float', default=None,
+                    help='Keep running, sweeping every given number of seconds.'),
+    )
+
+    def handle(self, *args, **options):
+        generator = StaticGenerator()
+
+        while True:
+            try:
+                paths = generator.sweep()
+            except StaticGeneratorException, err:
+                raise CommandError(str(err))
+
+            if int(options['verbosity']) > 1:
+                for path in paths:
+                    self.stdout.write('%s\n' % path)
+            if int(options['verbosity']) > 0:
+                self.stdout.write('%d expired\n' % len(paths))
+
+            if options['every'] is None:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Matching of paths against many URL regexes at once."""
+from collections import OrderedDict
+
+import re
+import threading
+
+# Characters that make a pattern a real regex rather than a literal
+REGEX_CHARS = '.^$*+?{}[]|()'
+
+# Regexes compiled together into a single alternation. Python's re module
+# doesn't support more than 100 groups in a pattern.
+REGEX_CHUNK_SIZE = 50
+
+# Inline flags apply to the whole regex and group numbers change once
+# combined, so patterns using them are compiled on their own.
+UNCOMBINABLE = re.compile(r'\(\?[iLmsux]+\)|\\[1-9]|\(\?P=')
+
+# Keys of the trie nodes that hold a pattern index, as opposed to the
+# single characters leading to the child nodes.
+PREFIX = None
+EXACT = ''
+
+
+def parse_literal(pattern):
+    """
+    Returns (literal, exact) for patterns that only match a literal prefix,
+    like r'^/blog' or r'^/about/$' (exact), None for any other pattern.
+    """
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+
+    exact = pattern.endswith('$') and not pattern.endswith('\\$')
+    if exact:
+        pattern = pattern[:-1]
+
+    chars = []
+    escaped = False
+
+    for char in pattern:
+        if escaped:
+            if char.isalnum():
+                # \d, \w, \1...
+                return None
+            chars.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in REGEX_CHARS:
+            return None
+        else:
+            chars.append(char)
+
+    if escaped:
+        return None
+
+    return ''.join(chars), exact
+
+
+class URLMatcher(object):
+    """
+    Matches paths like trying every re.match() of a list of patterns in
+    order, and returns the index of the first pattern that matches.
+
+    Literal patterns (r'^/', r'^/blog', r'^/about/$') are stored in a
+    prefix trie, walked once per path whatever the number of patterns. The
+    other patterns are compiled together into alternation regexes. The
+    latest cache_size decisions are kept in an LRU cache.
+    """
+
+    def __init__(self, patterns, cache_size=1000):
+        self.trie = {}
+        self.regexes = []
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.ttls = []
+
+        chunk = []
+        for index, pattern in enumerate(patterns):
+            if isinstance(pattern, (tuple, list)):
+                pattern, ttl = pattern
+            else:
+                ttl = None
+            self.ttls.append(ttl)
+
+            literal = parse_literal(pattern)
+            if literal is not None:
+                self.add_literal(index, *literal)
+                continue
+
+            if UNCOMBINABLE.search(pattern):
+                self.add_regexes(chunk)
+                self.add_regexes([(index, pattern)])
+                chunk = []
+                continue
+
+            chunk.append((index, pattern))
+            if len(chunk) == REGEX_CHUNK_SIZE:
+                self.add_regexes(chunk)
+                chunk = []
+
+        self.add_regexes(chunk)
+
+    def add_literal(self, index, literal, exact):
+        node = self.trie
+        for char in literal:
+            node = node.setdefault(char, {})
+
+        key = EXACT if exact else PREFIX
+        node.setdefault(key, index)
+
+    def add_regexes(self, regexes):
+        """
+        Compiles the regexes into one alternation, each one in a named group
+        so the one that matched can be found. If they can't be combined (a
+        named group used twice...) they are kept on their own.
+        """
+        if len(regexes) <= 1:
+            for index, pattern in regexes:
+                self.regexes.append((re.compile(pattern), index))
+            return
+
+        try:
+            combined = re.compile('|'.join(['(?P<p%d>%s)' % (index, pattern) for index, pattern in regexes]))
+        except (re.error, AssertionError):
+            for index, pattern in regexes:
+                self.regexes.append((re.compile(pattern), index))
+        else:
+            self.regexes.append((combined, None))
+
+    def match_literal(self, path):
+        node = self.trie
+        best = node.get(PREFIX)
+
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                return best
+
+            index = node.get(PREFIX)
+            if index is not None and (best is None or index < best):
+                best = index
+
+        index = node.get(EXACT)
+        if index is not None and (best is None or index < best):
+            best = index
+
+        return best
+
+    def match_regex(self, path):
+        for regex, index in self.regexes:
+            match = regex.match(path)
+            if match is not None:
+                return index if index is not None else int(match.lastgroup[1:])
+
+        return None
+
+    def match(self, path):
+        """Returns the index of the first pattern matching path, or None"""
+        with self.lock:
+            if path in self.cache:
+                index = self.cache.pop(path)
+                self.cache[path] = index
+                return index
+
+        matches = [i for i in (self.match_literal(path), self.match_regex(path)) if i is not None]
+        index = min(matches) if matches else None
+
+        with self.lock:
+            self.cache[path] = index
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return index
@@ -1,6 +1,14 @@
-import re
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
 from staticgenerator import StaticGenerator
+from dependencies import start_recording, stop_recording
+from locking import FillLocks
+from matching import URLMatcher
+
+import mimetypes
+import os
+import time
 
 class StaticGeneratorMiddleware(object):
     """
@@ -11,15 +19,143 @@ class StaticGeneratorMiddleware(object):
         STATIC_GENERATOR_URLS = (
             r'^/$',
             r'^/blog',
+            (r'^/news/', 300),
         )
+
+    Pages matching a (pattern, ttl) entry expire ttl seconds after being
+    published; the staticgenerator_sweep command deletes the expired files.
+    TTLs are recorded in the index of settings.STATIC_GENERATOR_INDEX.
+
+    With settings.STATIC_GENERATOR_ASYNC_WRITES the files are written by a
+    background thread (see BackgroundWriter) instead of during the response.
+
+    With settings.STATIC_GENERATOR_DEPENDENCY_INDEX the objects displayed by
+    every page are recorded, like StaticGenerator does.
+
+    With settings.STATIC_GENERATOR_FILL_LOCKS, a single request at a time
+    (across threads and processes) writes a given page; the others skip the
+    write. With settings.STATIC_GENERATOR_FILL_WAIT they wait up to that many
+    seconds for the page being written, and serve it. The lock files are
+    kept in settings.STATIC_GENERATOR_LOCK_DIR (see FillLocks).
+
+    With settings.STATIC_GENERATOR_RENDER_CACHE_SIZE, a page whose content
+    is the same as the one published recently (see RenderCache) isn't
+    written again, unless its file is missing.
     """
-    urls = tuple([re.compile(url) for url in settings.STATIC_GENERATOR_URLS])
+    urls = URLMatcher(
+        settings.STATIC_GENERATOR_URLS,
+        cache_size=getattr(settings, 'STATIC_GENERATOR_URL_CACHE_SIZE', 1000),
+    )
     gen = StaticGenerator()
+    writer = gen.get_writer() if getattr(settings, 'STATIC_GENERATOR_ASYNC_WRITES', False) else None
+    locks = (FillLocks(getattr(settings, 'STATIC_GENERATOR_LOCK_DIR', None))
+             if getattr(settings, 'STATIC_GENERATOR_FILL_LOCKS', False) else None)
+    fill_wait = getattr(settings, 'STATIC_GENERATOR_FILL_WAIT', 0)
+
+    def __init__(self):
+        if self.gen.published is None and any(ttl is not None for ttl in self.urls.ttls):
+            raise ImproperlyConfigured('STATIC_GENERATOR_URLS with ttls require STATIC_GENERATOR_INDEX')
+
+    def process_request(self, request):
+        if self.gen.dependencies is not None:
+            request._staticgenerator_keys = start_recording()
+
+        if self.locks is not None and self.urls.match(request.path_info) is not None:
+            return self.claim(request)
+
+    def claim(self, request):
+        """
+        Claims the fill lock of the requested page. When it was written by
+        another request while waiting for the lock, it's served from the
+        file instead, with the content type of its extension.
+        """
+        path = request.path_info
+        filename = self.gen.get_filename_from_path(path)[0]
+
+        start = time.time()
+        fd = self.locks.acquire(path, self.locks.get_lock_filename(filename), self.fill_wait)
+        request._staticgenerator_lock = fd
+
+        if fd is None or not self.fill_wait:
+            return None
+
+        try:
+            if os.stat(filename).st_mtime < start:
+                return None
+            with open(filename, 'rb') as f:
+                content = f.read()
+        except (OSError, IOError):
+            return None
+
+        self.release(request)
+        content_type = mimetypes.guess_type(filename)[0] or settings.DEFAULT_CONTENT_TYPE
+        if content_type.startswith('text/'):
+            content_type = '%s; charset=%s' % (content_type, settings.DEFAULT_CHARSET)
+        return HttpResponse(content, content_type=content_type)
+
+    def hand_over(self, request):
+        """
+        Takes the fill lock away from request, so it isn't released with the
+        response. Returns the function releasing it, or None.
+        """
+        fd = getattr(request, '_staticgenerator_lock', None)
+        if fd is None:
+            return None
+
+        request._staticgenerator_lock = None
+        path = request.path_info
+        return lambda: self.locks.release(path, fd)
+
+    def release(self, request):
+        fd = getattr(request, '_staticgenerator_lock', None)
+        if fd is not None:
+            request._staticgenerator_lock = None
+            self.locks.release(request.path_info, fd)
+
+    def process_exception(self, request, exception):
+        if self.locks is not None:
+            self.release(request)
 
     def process_response(self, request, response):
-        if response.status_code == 200:
-            for url in self.urls:
-                if url.match(request.path_info):
-                    self.gen.publish_from_path(request.path_info, response.content)
-                    break
+        keys = getattr(request, '_staticgenerator_keys', None)
+        if keys is not None:
+            keys = stop_recording(keys)
+
+        try:
+            self.publish_response(request, response, keys)
+        finally:
+            if self.locks is not None:
+                self.release(request)
+
         return response
+
+    def publish_response(self, request, response, keys):
+        if response.status_code != 200:
+            return
+
+        # Without the fill lock, another request is writing the page
+        if self.locks is not None and getattr(request, '_staticgenerator_lock', None) is None:
+            return
+
+        index = self.urls.match(request.path_info)
+        if index is not None:
+            if keys is not None:
+                self.gen.dependencies.set(request.path_info, keys)
+            # The fill lock is held until the writer thread wrote the page
+            done = self.hand_over(request) if self.writer is not None else None
+            self.publish(request.path_info, response.content, self.urls.ttls[index], done)
+
+    def publish(self, path, content, ttl=None, done=None):
+        """Publishes content to path, then calls done"""
+        try:
+            if self.writer is None:
+                self.gen.publish_from_path(path, content, ttl=ttl)
+            elif self.writer.put(path, content, ttl, done):
+                return
+        except:
+            if done is not None:
+                done()
+            raise
+
+        if done is not None:
+            done()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+Storages the published files are written to.
+
+Storages are given the absolute file names StaticGenerator computes from the
+web root, and raise EnvironmentError (OSError, IOError) subclasses, which
+StaticGenerator turns into StaticGeneratorException.
+"""
+from cStringIO import StringIO
+
+import errno
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+
+class FileSystemStorage(object):
+    """Writes the files to the local filesystem (the default)"""
+
+    def exists(self, name):
+        return os.path.exists(name)
+
+    def makedirs(self, directory):
+        os.makedirs(directory)
+
+    def getsize(self, filename):
+        """Returns the size of filename, None if it doesn't exist"""
+        try:
+            return os.stat(filename).st_size
+        except OSError:
+            return None
+
+    def read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def write(self, filename, directory, content, sync=False):
+        """Atomically writes content to filename, through a temporary file"""
+        f, tmpname = tempfile.mkstemp(dir=directory)
+        os.write(f, content)
+        if sync:
+            os.fsync(f)
+        os.close(f)
+        os.chmod(tmpname, 0644)
+        os.rename(tmpname, filename)
+
+    def sync_directory(self, directory):
+        """Syncs the entries of directory (created or renamed files) to disk"""
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def remove(self, filename):
+        os.remove(filename)
+
+    def discard(self, filename):
+        """Removes filename if it exists, with a single unlink"""
+        try:
+            os.unlink(filename)
+        except OSError, err:
+            if err.errno != errno.ENOENT:
+                raise
+
+    def rmdir(self, directory):
+        """Removes directory, raises OSError if it isn't empty"""
+        os.rmdir(directory)
+
+    def listdir(self, directory):
+        """Returns the entries of directory, none if it doesn't exist"""
+        try:
+            return os.listdir(directory)
+        except OSError, err:
+            if err.errno != errno.ENOENT:
+                raise
+            return []
+
+    def remove_tree(self, name):
+        """
+        Removes the file or directory name, if it exists. Directories are
+        renamed away first so they disappear at once, then removed.
+        """
+        try:
+            os.unlink(name)
+            return
+        except OSError, err:
+            if err.errno == errno.ENOENT:
+                return
+            if err.errno not in (errno.EISDIR, errno.EPERM):
+                raise
+
+        parent, base = os.path.split(name)
+        trash = tempfile.mktemp(prefix='.%s.deleted-' % base, dir=parent)
+        try:
+            os.rename(name, trash)
+        except OSError, err:
+            if err.errno == errno.ENOENT:
+                return
+            raise
+
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(object):
+    """
+    Keeps the files in memory, in files (a dict of file name to content).
+    Useful to build a site, or part of it, without touching the disk.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.directories = set()
+        self.lock = threading.Lock()
+
+    def not_found(self, name):
+        return OSError(errno.ENOENT, os.strerror(errno.ENOENT), name)
+
+    def exists(self, name):
+        return name in self.files or name in self.directories
+
+    def makedirs(self, directory):
+        with self.lock:
+            while directory not in self.directories and directory not in ('', os.sep):
+                self.directories.add(directory)
+                directory = os.path.dirname(directory)
+
+    def getsize(self, filename):
+        content = self.files.get(filename)
+        return None if content is None else len(content)
+
+    def read(self, filename):
+        try:
+            return self.files[filename]
+        except KeyError:
+            raise self.not_found(filename)
+
+    def write(self, filename, directory, content, sync=False):
+        if directory not in self.directories:
+            raise self.not_found(directory)
+        self.files[filename] = content
+
+    def sync_directory(self, directory):
+        pass
+
+    def remove(self, filename):
+        try:
+            del self.files[filename]
+        except KeyError:
+            raise self.not_found(filename)
+
+    def discard(self, filename):
+        self.files.pop(filename, None)
+
+    def rmdir(self, directory):
+        with self.lock:
+            if self.listdir(directory):
+                raise OSError(errno.ENOTEMPTY, os.strerror(errno.ENOTEMPTY), directory)
+            self.directories.discard(directory)
+
+    def listdir(self, directory):
+        prefix = os.path.join(directory, '')
+        return sorted(set(name[len(prefix):].split(os.sep)[0]
+                          for name in list(self.files) + list(self.directories) if name.startswith(prefix)))
+
+    def remove_tree(self, name):
+        prefix = os.path.join(name, '')
+        with self.lock:
+            for filename in [filename for filename in self.files if filename == name or filename.startswith(prefix)]:
+                del self.files[filename]
+            self.directories = set(directory for directory in self.directories
+                                   if directory != name and not directory.startswith(prefix))
+
+    def close(self):
+        pass
+
+
+class ArchiveStorage(object):
+    """
+    Streams the files into a single tar or zip archive (chosen from the
+    extension of filename: .zip, .tar, .tar.gz, .tgz or .tar.bz2), stored
+    relative to root (the web root by default). The archive is written
+    next to filename and renamed over it by close(), so it's replaced
+    atomically once complete.
+
+    Files can't be read back or removed once written. The archive must be
+    written by a single process: use the 'serial' or 'thread' executors.
+    """
+
+    def __init__(self, filename, root=None):
+        self.filename = filename
+        self.root = root
+        self.names = set()
+        self.lock = threading.Lock()
+        self.archive = None
+        self.tmpname = None
+
+    def open(self):
+        f, self.tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)))
+        os.close(f)
+
+        if self.filename.endswith('.zip'):
+            self.archive = zipfile.ZipFile(self.tmpname, 'w', zipfile.ZIP_DEFLATED)
+        elif self.filename.endswith(('.tar.gz', '.tgz')):
+            self.archive = tarfile.open(self.tmpname, 'w:gz')
+        elif self.filename.endswith('.tar.bz2'):
+            self.archive = tarfile.open(self.tmpname, 'w:bz2')
+        else:
+            self.archive = tarfile.open(self.tmpname, 'w')
+
+    def get_name(self, filename):
+        """Returns the name of filename in the archive"""
+        return os.path.relpath(filename, self.root) if self.root else filename.lstrip(os.sep)
+
+    def read_only(self, name):
+        return IOError(errno.EROFS, 'Files can not be removed from an archive', name)
+
+    def exists(self, name):
+        return name in self.names
+
+    def makedirs(self, directory):
+        self.names.add(directory)
+
+    def getsize(self, filename):
+        return None
+
+    def read(self, filename):
+        raise self.read_only(filename)
+
+    def write(self, filename, directory, content, sync=False):
+        name = self.get_name(filename)
+
+        with self.lock:
+            if self.archive is None:
+                self.open()
+
+            if isinstance(self.archive, zipfile.ZipFile):
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+                info.external_attr = 0644 << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                self.archive.writestr(info, content)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = time.time()
+                info.mode = 0644
+                self.archive.addfile(info, StringIO(content))
+
+            self.names.add(filename)
+
+    def sync_directory(self, directory):
+        pass
+
+    def remove(self, filename):
+        raise self.read_only(filename)
+
+    def discard(self, filename):
+        if filename in self.names:
+            raise self.read_only(filename)
+
+    def rmdir(self, directory):
+        raise self.read_only(directory)
+
+    def listdir(self, directory):
+        return []
+
+    def remove_tree(self, name):
+        raise self.read_only(name)
+
+    def close(self):
+        """Completes the archive and moves it in place"""
+        with self.lock:
+            if self.archive is None:
+                self.open()
+
+            self.archive.close()
+            os.chmod(self.tmpname, 0644)
+            os.rename(self.tmpname, self.filename)
+            self.archive = None
+
+    def abort(self):
+        """Drops the archive being written, leaving filename untouched"""
+        with self.lock:
+            if self.archive is not None:
+                self.archive.close()
+                os.remove(self.tmpname)
+                self.archive = None
+
+
+STORAGES = {
+    'filesystem': FileSystemStorage,
+    'memory': MemoryStorage,
+}
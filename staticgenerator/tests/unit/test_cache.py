@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import time
+
+from staticgenerator.staticgenerator.cache import RenderCache, get_cache
+
+
+def test_render_cache_evicts_the_least_recently_used_beyond_max_bytes():
+    cache = RenderCache(max_bytes=10)
+
+    cache.set('/a/', 'aaaa')
+    cache.set('/b/', 'bbbb')
+    assert cache.get('/a/') == 'aaaa'
+
+    cache.set('/c/', 'cccc')
+    assert cache.get('/b/') is None
+    assert cache.get('/a/') == 'aaaa'
+    assert cache.get('/c/') == 'cccc'
+
+    cache.set('/big/', 'x' * 11)
+    assert cache.get('/big/') is None
+
+    assert cache.stats() == {'hits': 3, 'misses': 2, 'entries': 2, 'bytes': 8}
+
+
+def test_render_cache_expires_entries():
+    cache = RenderCache(max_bytes=100, ttl=0.05)
+
+    cache.set('/', 'content')
+    assert cache.get('/') == 'content'
+
+    time.sleep(0.1)
+    assert cache.get('/') is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_render_cache_discards_paths_and_prefixes():
+    cache = RenderCache(max_bytes=100)
+
+    for path in ('/', '/blog/1/', '/blog/2/'):
+        cache.set(path, 'content')
+
+    cache.discard_prefix('/blog/')
+    cache.discard('/')
+    assert cache.stats()['entries'] == 0
+
+
+def test_get_cache_shares_instances():
+    assert get_cache(1000, 60) is get_cache(1000, 60)
+    assert get_cache(1000, 60) is not get_cache(1000, 30)
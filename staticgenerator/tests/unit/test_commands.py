@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+from cStringIO import StringIO
+
+import os
+import tempfile
+
+from django.core.management.base import CommandError
+from django.db.models import Model
+from django.db.models.query import QuerySet
+
+from staticgenerator.staticgenerator import StaticGenerator, StaticGeneratorException, get_shard
+from staticgenerator.staticgenerator.management.commands.staticgenerator_build import Command, get_resources, parse_shard
+import staticgenerator.staticgenerator
+
+
+class BuildModel(Model):
+    pass
+
+queryset = QuerySet(BuildModel)
+paths = ['/a/', '/b/']
+
+
+def get_paths():
+    return ['/c/']
+
+
+def get_queryset():
+    return queryset
+
+
+def test_parse_shard():
+    assert parse_shard('1/3') == (1, 3)
+
+    for shard in ('1', 'a/3', '3/3', '-1/3'):
+        try:
+            parse_shard(shard)
+        except CommandError:
+            continue
+        assert False, "Shouldn't have gotten this far."
+
+
+def test_get_shard_hashes_unicode_paths():
+    assert get_shard(u'/café/', 7) == get_shard(u'/café/'.encode('utf-8'), 7)
+
+
+def test_get_resources_keeps_querysets_and_models_whole():
+    module = __name__
+
+    resources = get_resources(['/about/', module + '.paths', module + '.get_paths',
+                               module + '.queryset', module + '.get_queryset', module + '.BuildModel'])
+
+    assert resources[:4] == ['/about/', '/a/', '/b/', '/c/']
+    assert resources[4] is queryset
+    assert resources[5] is queryset
+    assert resources[6] is BuildModel
+
+
+def test_get_resources_rejects_unknown_names():
+    try:
+        get_resources([__name__ + '.missing'])
+    except CommandError, err:
+        assert str(err) == 'Unknown resource: %s.missing' % __name__
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def run_build(*args, **options):
+    command = Command()
+    command.stdout = StringIO()
+    command.stderr = StringIO()
+
+    defaults = {'shard': None, 'executor': None, 'workers': None, 'archive': None,
+                'generation': False, 'verbosity': 1}
+    defaults.update(options)
+    command.handle(*args, **defaults)
+    return command
+
+
+def build_with(web_root, func, *args, **options):
+    from django.conf import settings
+
+    old_web_root = settings.WEB_ROOT
+    settings.WEB_ROOT = web_root
+    staticgenerator.staticgenerator.clear_resolved()
+
+    original_get_content_from_path = StaticGenerator.get_content_from_path
+    StaticGenerator.get_content_from_path = func
+    try:
+        return run_build(*args, **options)
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+        settings.WEB_ROOT = old_web_root
+        staticgenerator.staticgenerator.clear_resolved()
+
+
+def test_build_command_publishes_and_reports():
+    web_root = tempfile.mkdtemp()
+
+    command = build_with(web_root, lambda self, path: 'content', '/', '/about/')
+
+    assert command.stdout.getvalue() == '2 written, 0 skipped, 0 failed\n'
+    assert os.path.exists(os.path.join(web_root, 'index.html'))
+    assert os.path.exists(os.path.join(web_root, 'about', 'index.html'))
+
+
+def test_build_command_fails_with_the_failed_paths():
+    def get_content_from_path(self, path):
+        if path == '/missing/':
+            raise StaticGeneratorException('not found')
+        return 'content'
+
+    try:
+        build_with(tempfile.mkdtemp(), get_content_from_path, '/', '/missing/')
+    except CommandError, err:
+        assert str(err) == '1 paths could not be published'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_build_command_rejects_generations_with_shards():
+    try:
+        run_build('/', generation=True, shard='0/2')
+    except CommandError, err:
+        assert str(err) == '--generation can not be used with --archive or --shard'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_build_command_rejects_archives_with_the_process_executor_setting():
+    from django.conf import settings
+
+    archive = os.path.join(tempfile.mkdtemp(), 'site.tar')
+    settings.STATIC_GENERATOR_EXECUTOR = 'process'
+    try:
+        run_build('/', archive=archive)
+    except CommandError, err:
+        assert str(err) == 'Archives can not be written by the process executor'
+        assert os.listdir(os.path.dirname(archive)) == []
+        return
+    finally:
+        del settings.STATIC_GENERATOR_EXECUTOR
+
+    assert False, "Shouldn't have gotten this far."
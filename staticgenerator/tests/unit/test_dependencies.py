@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+from django.db.models import CharField, Model, Q
+from django.db.models.query import QuerySet
+from django.db.models.sql.compiler import SQLCompiler, SQLUpdateCompiler
+from django.db.models.sql.where import WhereNode
+
+from staticgenerator.staticgenerator import dependencies
+from staticgenerator.staticgenerator.dependencies import is_recording, is_single_lookup, start_recording, stop_recording
+
+
+class RecordedModel(Model):
+    name = CharField(max_length=10)
+
+
+class JoinedModel(Model):
+    pass
+
+
+class Query(object):
+
+    def __init__(self, model, *tables):
+        self.model = model
+        self.where = WhereNode()
+        self.table_map = dict((table, [table]) for table in tables)
+
+
+def get_compiler(compiler_class, query):
+    compiler = compiler_class.__new__(compiler_class)
+    compiler.query = query
+    return compiler
+
+
+def test_instances_are_recorded():
+    keys = start_recording()
+    try:
+        RecordedModel(id=1)
+        RecordedModel()
+    finally:
+        assert stop_recording(keys) is keys
+
+    assert keys == set(['unit.recordedmodel:1'])
+
+
+def test_queries_are_recorded_without_instances():
+    original_models_by_table = dependencies._models_by_table
+    dependencies._models_by_table = {'unit_joinedmodel': JoinedModel}
+
+    keys = start_recording()
+    try:
+        dependencies._record_query(get_compiler(SQLCompiler, Query(RecordedModel, 'unit_recordedmodel',
+                                                                   'unit_joinedmodel', 'raw_table')))
+        dependencies._record_query(get_compiler(SQLUpdateCompiler, Query(RecordedModel)))
+    finally:
+        stop_recording(keys)
+        dependencies._models_by_table = original_models_by_table
+
+    assert keys == set(['unit.recordedmodel', 'unit.joinedmodel'])
+
+
+def test_single_object_lookups_only_record_instances():
+    queryset = QuerySet(RecordedModel)
+
+    assert is_single_lookup(queryset.filter(pk=1).query)
+    assert is_single_lookup(queryset.filter(id=1, name='name').query)
+    assert not is_single_lookup(queryset.query)
+    assert not is_single_lookup(queryset.filter(name='name').query)
+    assert not is_single_lookup(queryset.filter(pk__in=[1, 2]).query)
+    assert not is_single_lookup(queryset.exclude(pk=1).query)
+    assert not is_single_lookup(queryset.filter(Q(pk=1) | Q(pk=2)).query)
+
+    keys = start_recording()
+    try:
+        dependencies._record_query(get_compiler(SQLCompiler, queryset.filter(pk=1).query))
+    finally:
+        stop_recording(keys)
+
+    assert keys == set()
+
+
+def test_recordings_can_nest():
+    assert not is_recording()
+
+    outer = start_recording()
+    RecordedModel(id=1)
+    inner = start_recording()
+    RecordedModel(id=2)
+    assert stop_recording(inner) == set(['unit.recordedmodel:2'])
+    RecordedModel(id=3)
+    assert is_recording()
+    assert stop_recording(outer) == set(['unit.recordedmodel:1', 'unit.recordedmodel:2', 'unit.recordedmodel:3'])
+
+    assert not is_recording()
+    assert stop_recording(outer) is None
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import os
+import tempfile
+import time
+
+from staticgenerator.staticgenerator.index import DependencyIndex, PublishedIndex, get_index
+
+
+def get_filename():
+    return os.path.join(tempfile.mkdtemp(), 'index.db')
+
+
+def test_dependency_index_keeps_paths_by_key():
+    index = DependencyIndex(get_filename())
+
+    index.set('/', ['blog.post', 'blog.post:1', 'blog.post:2'])
+    index.set('/blog/1/', ['blog.post', 'blog.post:1'])
+
+    assert index.get_paths(['blog.post:2']) == ['/']
+    assert index.get_paths(['blog.post:1']) == ['/', '/blog/1/']
+    assert index.get_paths(['blog.post:3']) == []
+    assert index.get_paths([]) == []
+
+
+def test_dependency_index_replaces_and_removes_paths():
+    index = DependencyIndex(get_filename())
+
+    index.set('/', ['blog.post:1'])
+    index.set('/', ['blog.post:2'])
+    assert index.get_paths(['blog.post:1']) == []
+
+    index.remove('/')
+    assert index.get_paths(['blog.post:2']) == []
+
+
+def test_get_index_shares_instances():
+    filename = get_filename()
+
+    assert get_index(DependencyIndex, filename) is get_index(DependencyIndex, filename)
+
+
+def test_published_index_queries_by_prefix_and_glob():
+    index = PublishedIndex(get_filename())
+
+    for path in ('/', '/blog/2023/', '/blog/2024/', '/blog/2024/01/', '/blog/[draft]/', '/about/'):
+        index.add(path, 'digest', 10)
+
+    assert index.prefix('/blog/2024/') == ['/blog/2024/', '/blog/2024/01/']
+    assert index.prefix('/blog/[') == ['/blog/[draft]/']
+    assert index.glob('/blog/20??/') == ['/blog/2023/', '/blog/2024/']
+    assert index.get('/about/') == ('digest', 10)
+
+    index.remove_glob('/blog/*')
+    index.remove('/about/')
+    assert index.glob('*') == ['/']
+    assert index.get('/about/') is None
+
+
+def test_published_index_lists_stale_paths():
+    index = PublishedIndex(get_filename())
+
+    index.add('/old/', 'digest', 10)
+    now = time.time()
+    index.add('/new/', 'digest', 10)
+    index.connection.execute('UPDATE published SET published = ? WHERE path = ?', (now - 60, '/old/'))
+
+    assert index.stale(now - 30) == ['/old/']
+
+
+def test_index_batches_writes_in_one_transaction():
+    filename = get_filename()
+    index = PublishedIndex(filename)
+    other = PublishedIndex(filename)
+
+    assert index.connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+
+    with index.batch():
+        index.add('/', 'digest', 10)
+        index.add('/about/', 'digest', 10)
+        assert other.get('/') is None
+
+    assert other.glob('*') == ['/', '/about/']
+
+    try:
+        with index.batch():
+            index.add('/blog/', 'digest', 10)
+            raise ValueError()
+    except ValueError:
+        pass
+
+    assert other.get('/blog/') == ('digest', 10)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+from staticgenerator.staticgenerator.instrumentation import Stats
+
+
+def test_stats_aggregates_phases():
+    stats = Stats(slowest=2)
+
+    stats('render', '/', 0.5, 100)
+    stats('render', '/blog/', 0.002, 50)
+    stats('write', '/', 0.0001, 100)
+    stats('write', '/blog/', 20, 50)
+
+    report = stats.report()
+
+    assert report['totals']['render'] == {'count': 2, 'seconds': 0.502, 'bytes': 150}
+    assert report['totals']['write']['count'] == 2
+    assert [count for label, count in report['histograms']['render']] == [0, 1, 0, 1, 0, 0]
+    assert [count for label, count in report['histograms']['write']] == [1, 0, 0, 0, 0, 1]
+    assert report['slowest'] == [(20, 'write', '/blog/'), (0.5, 'render', '/')]
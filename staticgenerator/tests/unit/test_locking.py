@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from staticgenerator.staticgenerator.locking import FillLocks, get_lock_filename
+
+
+def test_get_lock_filename():
+    lock_filename = get_lock_filename('/tmp/locks', '/var/www/blog/index.html')
+
+    assert lock_filename == '/tmp/locks/%s.lock' % hashlib.md5('/var/www/blog/index.html').hexdigest()
+    assert get_lock_filename('/tmp/locks', u'/var/www/blog/index.html') == lock_filename
+
+
+def test_fill_locks_keep_lock_files_in_their_directory():
+    directory = os.path.join(tempfile.mkdtemp(), 'locks')
+    locks = FillLocks(directory)
+
+    lock_filename = locks.get_lock_filename('/var/www/blog/index.html')
+    assert os.path.dirname(lock_filename) == directory
+    assert os.path.isdir(directory)
+
+
+def test_fill_locks_claim_paths_once():
+    locks = FillLocks()
+    lock_filename = os.path.join(tempfile.mkdtemp(), '.index.html.lock')
+
+    fd = locks.acquire('/', lock_filename)
+    assert fd is not None
+    assert locks.acquire('/', lock_filename) is None
+    assert locks.acquire('/', lock_filename, timeout=0.1) is None
+
+    locks.release('/', fd)
+    fd = locks.acquire('/', lock_filename)
+    assert fd is not None
+    locks.release('/', fd)
+
+
+def test_fill_locks_wait_for_the_holder():
+    locks = FillLocks()
+    lock_filename = os.path.join(tempfile.mkdtemp(), '.index.html.lock')
+    fd = locks.acquire('/', lock_filename)
+
+    def release():
+        time.sleep(0.1)
+        locks.release('/', fd)
+
+    thread = threading.Thread(target=release)
+    thread.start()
+
+    waited = locks.acquire('/', lock_filename, timeout=5)
+    thread.join()
+    assert waited is not None
+    locks.release('/', waited)
+
+
+def test_fill_locks_respect_other_processes():
+    locks = FillLocks()
+    lock_filename = os.path.join(tempfile.mkdtemp(), '.index.html.lock')
+
+    # flock locks belong to the open file, so this stands for another process
+    other = os.open(lock_filename, os.O_RDWR | os.O_CREAT)
+    fcntl.flock(other, fcntl.LOCK_EX)
+
+    try:
+        assert locks.acquire('/', lock_filename, timeout=0.1) is None
+        assert not locks.claimed
+    finally:
+        os.close(other)
+
+    fd = locks.acquire('/', lock_filename)
+    assert fd is not None
+    locks.release('/', fd)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import re
+
+from staticgenerator.staticgenerator.matching import URLMatcher, parse_literal
+
+
+PATTERNS = (
+    r'^/$',
+    r'^/blog',
+    r'^/about/$',
+    r'^/news/\d+/$',
+    r'^/(archive|old)/(\d+)/\2/$',
+    r'/feeds/',
+    r'^/blog/(?P<slug>[-\w]+)/$',
+    r'^/search/\?',
+    r'(?i)^/Contact/$',
+    r'^/(?P<section>\w+)/(?P=section)/$',
+)
+
+
+def first_match(path):
+    for index, pattern in enumerate(PATTERNS):
+        if re.match(pattern, path):
+            return index
+    return None
+
+
+def test_parse_literal():
+    assert parse_literal(r'^/blog') == ('/blog', False)
+    assert parse_literal(r'^/about/$') == ('/about/', True)
+    assert parse_literal(r'^/search/\?') == ('/search/?', False)
+    assert parse_literal(r'^/news/\d+/$') is None
+    assert parse_literal(r'^/(blog|news)') is None
+
+
+def test_matcher_matches_like_the_patterns_in_order():
+    matcher = URLMatcher(PATTERNS)
+
+    for path in ('/', '/blog', '/blog/some-post/', '/about/', '/about/team/',
+                 '/news/12/', '/news/latest/', '/feeds/', '/search/?q=1',
+                 '/contact/', '/CONTACT/', '/archive/1/1/', '/old/1/2/',
+                 '/Blog', '/team/team/', '/team/blog/', ''):
+        assert matcher.match(path) == first_match(path), path
+
+
+def test_matcher_handles_more_patterns_than_regex_groups():
+    patterns = [r'^/page-%d/\d+/$' % i for i in range(250)]
+    matcher = URLMatcher(patterns)
+
+    assert matcher.match('/page-0/1/') == 0
+    assert matcher.match('/page-249/1/') == 249
+    assert matcher.match('/page-250/1/') is None
+
+
+def test_matcher_caches_recent_paths():
+    matcher = URLMatcher(PATTERNS, cache_size=2)
+
+    matcher.match('/')
+    matcher.match('/blog')
+    matcher.match('/')
+    matcher.match('/contact/')
+
+    assert list(matcher.cache) == ['/', '/contact/']
+
+
+def test_matcher_keeps_the_ttls_of_the_patterns():
+    matcher = URLMatcher([(r'^/news/', 300), r'^/$', (r'^/blog/\d+/$', None)])
+
+    assert matcher.ttls == [300, None, None]
+    assert matcher.match('/news/1/') == 0
+    assert matcher.match('/blog/1/') == 2
@@ -3,6 +3,7 @@
 
 import os
 import tempfile
+import time
 
 from contextlib import contextmanager
 from unittest import skip
@@ -28,6 +29,7 @@ def remove_web_root_from_settings():
 
     old_web_root = settings.WEB_ROOT
     del settings.WEB_ROOT
+    staticgenerator.staticgenerator.clear_resolved()
 
     try:
         yield
@@ -35,6 +37,7 @@ def remove_web_root_from_settings():
         raise
     finally:
         settings.WEB_ROOT = old_web_root
+        staticgenerator.staticgenerator.clear_resolved()
 
 
 def get_mocks(mox):
@@ -197,8 +200,9 @@ def test_extract_resources_when_resource_is_a_str():
                                queryset=queryset,
                                settings=settings)
 
-    assert len(instance.resources) == 1
-    assert instance.resources[0] == "some_str"
+    resources = list(instance.resources)
+    assert len(resources) == 1
+    assert resources[0] == "some_str"
     mox.VerifyAll()
 
 
@@ -228,8 +232,9 @@ def test_extract_resources_when_resource_is_a_model():
         settings=settings
     )
 
-    assert len(instance.resources) == 1
-    assert instance.resources[0] == 'some_model_url'
+    resources = list(instance.resources)
+    assert len(resources) == 1
+    assert resources[0] == 'some_model_url'
     mox.VerifyAll()
 
 
@@ -732,3 +737,1231 @@ def test_request_exception_raises_proper_exception():
 
     mox.UnsetStubs()
     assert False, "Shouldn't have gotten this far."
+
+
+def test_publish_with_thread_executor():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    FILE_CONTENT = 'some_content'
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    try:
+        with remove_web_root_from_settings():
+            get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: FILE_CONTENT
+            instance = StaticGenerator(
+                'some_path_1', 'some_path_2', 'some_path_3',
+                settings=settings,
+                executor='thread',
+                workers=2,
+            )
+
+            instance.publish()
+
+        for path in ('some_path_1', 'some_path_2', 'some_path_3'):
+            with open(os.path.join(FAKE_WEB_ROOT, path), 'r') as fd:
+                assert fd.readline() == FILE_CONTENT
+    finally:
+        StaticGenerator.get_content_from_path = get_content_from_path
+
+
+def test_publish_with_process_executor():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    FILE_CONTENT = 'some_content'
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    try:
+        with remove_web_root_from_settings():
+            get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: FILE_CONTENT
+            instance = StaticGenerator(
+                'some_path_1', 'some_path_2',
+                settings=settings,
+                executor='process',
+                workers=2,
+            )
+
+            instance.publish()
+
+        for path in ('some_path_1', 'some_path_2'):
+            with open(os.path.join(FAKE_WEB_ROOT, path), 'r') as fd:
+                assert fd.readline() == FILE_CONTENT
+    finally:
+        StaticGenerator.get_content_from_path = get_content_from_path
+
+
+def test_publish_collects_errors_per_path():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    def get_content_from_path(self, path):
+        if path == 'broken_path':
+            raise StaticGeneratorException('broken')
+        return 'some_content'
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator(
+                'broken_path', 'some_path',
+                settings=settings,
+                executor='thread',
+                collect_errors=True,
+            )
+
+            instance.publish()
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert len(instance.errors) == 1
+    assert instance.errors[0][0] == 'broken_path'
+    assert str(instance.errors[0][1]) == 'broken'
+    assert os.path.exists(os.path.join(FAKE_WEB_ROOT, 'some_path'))
+
+
+def test_unknown_executor_raises():
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+
+    try:
+        StaticGenerator(settings=settings, executor='foo')
+    except StaticGeneratorException, e:
+        assert str(e) == 'Unknown executor: foo'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_handler_is_reused_between_pages():
+    mox = Mox()
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+
+    handler_mock_class = mox.CreateMockAnything()
+    handler_mock_class.__call__().AndReturn('handler')
+
+    mox.ReplayAll()
+
+    try:
+        dummy_handler = staticgenerator.staticgenerator.DummyHandler
+        staticgenerator.staticgenerator.DummyHandler = handler_mock_class
+
+        instance = StaticGenerator(settings=settings)
+
+        first_handler, first_factory = instance.get_handler()
+        second_handler, second_factory = instance.get_handler()
+    finally:
+        staticgenerator.staticgenerator.DummyHandler = dummy_handler
+
+    assert first_handler is second_handler
+    assert first_factory is second_factory
+    mox.VerifyAll()
+
+
+def test_handler_is_rebuilt_when_settings_change():
+    from django.test.signals import setting_changed
+
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+    instance = StaticGenerator(settings=settings)
+
+    handler, _ = instance.get_handler()
+    setting_changed.send(sender=CustomSettings, setting='MIDDLEWARE_CLASSES', value=())
+
+    assert instance.get_handler()[0] is not handler
+    assert instance.get_handler()[0] is instance.get_handler()[0]
+
+
+def test_extract_resources_reads_querysets_in_chunks():
+    mox = Mox()
+    settings = CustomSettings(WEB_ROOT="some_web_root")
+
+    def get_obj(pk):
+        obj = mox.CreateMockAnything()
+        obj.pk = pk
+        obj.get_absolute_url().AndReturn('/%d/' % pk)
+        return obj
+
+    queryset = mox.CreateMockAnything()
+    ordered = mox.CreateMockAnything()
+    first_chunk = mox.CreateMockAnything()
+    second_chunk = mox.CreateMockAnything()
+    queryset.query = mox.CreateMockAnything()
+
+    queryset.query.can_filter().AndReturn(True)
+    queryset.order_by('pk').AndReturn(ordered)
+    ordered.__getslice__(0, 2).AndReturn(first_chunk)
+    first_chunk.iterator().AndReturn(iter([get_obj(1), get_obj(2)]))
+    ordered.filter(pk__gt=2).AndReturn(second_chunk)
+    second_chunk.__getslice__(0, 2).AndReturn(second_chunk)
+    second_chunk.iterator().AndReturn(iter([get_obj(3)]))
+
+    mox.ReplayAll()
+
+    instance = StaticGenerator(settings=settings, chunk_size=2)
+
+    assert list(instance.iter_queryset(queryset)) == ['/1/', '/2/', '/3/']
+    mox.VerifyAll()
+
+
+def test_resources_are_extracted_lazily():
+    settings = CustomSettings(WEB_ROOT="some_web_root")
+    extracted = []
+
+    class LazyModel(Model):
+
+        def get_absolute_url(self):
+            extracted.append(self)
+            return 'some_model_url'
+
+    instance = StaticGenerator(LazyModel(), settings=settings)
+
+    assert extracted == []
+    assert list(instance.resources) == ['some_model_url']
+    assert list(instance.resources) == ['some_model_url']
+    assert len(extracted) == 2
+
+
+def test_resources_are_deduplicated_within_a_chunk():
+    settings = CustomSettings(WEB_ROOT="some_web_root")
+
+    instance = StaticGenerator('/a', '/b', '/a', '/c', '/a', settings=settings, chunk_size=2)
+
+    assert list(instance.resources) == ['/a', '/b', '/c', '/a']
+
+
+def test_publish_skips_unchanged_files():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with open(os.path.join(FAKE_WEB_ROOT, 'same_path'), 'w') as fd:
+        fd.write('some_content')
+
+    with open(os.path.join(FAKE_WEB_ROOT, 'changed_path'), 'w') as fd:
+        fd.write('old_content')
+
+    try:
+        with remove_web_root_from_settings():
+            get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: 'some_content'
+            instance = StaticGenerator(
+                'same_path', 'changed_path', 'new_path',
+                settings=settings,
+                skip_unchanged=True,
+            )
+
+            inode = os.stat(os.path.join(FAKE_WEB_ROOT, 'same_path')).st_ino
+            results = instance.publish()
+    finally:
+        StaticGenerator.get_content_from_path = get_content_from_path
+
+    assert results == [False, True, True]
+    assert instance.stats == {'written': 2, 'skipped': 1}
+    assert os.stat(os.path.join(FAKE_WEB_ROOT, 'same_path')).st_ino == inode
+
+    with open(os.path.join(FAKE_WEB_ROOT, 'changed_path'), 'r') as fd:
+        assert fd.read() == 'some_content'
+
+
+def test_publish_writes_compressed_variants():
+    import gzip
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    FILE_CONTENT = 'some_content' * 100
+    FILE_RELATIVE_PATH = os.path.join(FAKE_WEB_ROOT, 'some_path')
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(
+            settings=settings,
+            compress=('gzip', 'brotli'),
+        )
+        instance.publish_from_path('some_path', content=FILE_CONTENT)
+
+        assert gzip.open(FILE_RELATIVE_PATH + '.gz').read() == FILE_CONTENT
+
+        instance.delete_from_path('some_path')
+
+    assert not os.path.exists(FILE_RELATIVE_PATH)
+    assert not os.path.exists(FILE_RELATIVE_PATH + '.gz')
+
+
+def test_skipped_files_get_their_missing_variants():
+    import gzip
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    FILE_CONTENT = 'some_content' * 100
+    FILE_RELATIVE_PATH = os.path.join(FAKE_WEB_ROOT, 'some_path')
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, skip_unchanged=True)
+        assert instance.publish_from_path('some_path', content=FILE_CONTENT)
+
+        instance = StaticGenerator(settings=settings, skip_unchanged=True, compress=('gzip',))
+        assert not instance.publish_from_path('some_path', content=FILE_CONTENT)
+
+    assert gzip.open(FILE_RELATIVE_PATH + '.gz').read() == FILE_CONTENT
+
+
+def test_publish_does_not_compress_small_files():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    FILE_RELATIVE_PATH = os.path.join(FAKE_WEB_ROOT, 'some_path')
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(
+            settings=settings,
+            compress=('gzip',),
+            compress_min_size=100,
+        )
+        instance.publish_from_path('some_path', content='some_content' * 100)
+        instance.publish_from_path('some_path', content='some_content')
+
+    assert os.path.exists(FILE_RELATIVE_PATH)
+    assert not os.path.exists(FILE_RELATIVE_PATH + '.gz')
+
+
+def test_unknown_compression_raises():
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+
+    try:
+        StaticGenerator(settings=settings, compress=('foo',))
+    except StaticGeneratorException, e:
+        assert str(e) == 'Unknown compression: foo'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+class DependencyModel(Model):
+
+    def get_absolute_url(self):
+        return '/dependency/%s/' % self.pk
+
+
+def test_get_content_from_path_records_dependencies():
+    from staticgenerator.staticgenerator.index import DependencyIndex
+
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+    index = DependencyIndex(os.path.join(tempfile.mkdtemp(), 'index.db'))
+
+    class RequestFactory(object):
+
+        def get(self, path):
+            return CustomSettings(META={})
+
+    def handler(request):
+        DependencyModel(id=1)
+        DependencyModel()
+        return CustomSettings(status_code=200, content='foo')
+
+    instance = StaticGenerator(settings=settings, dependency_index=index)
+    instance.get_handler = lambda: (handler, RequestFactory())
+
+    assert instance.get_content_from_path('/') == 'foo'
+    assert index.get_paths(['unit.dependencymodel:1']) == ['/']
+    assert index.get_paths(['unit.dependencymodel']) == []
+    assert index.get_paths(['unit.dependencymodel:None']) == []
+
+
+def test_publish_dependents_publishes_and_deletes_dependent_paths():
+    from staticgenerator.staticgenerator.index import DependencyIndex
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    index = DependencyIndex(os.path.join(tempfile.mkdtemp(), 'index.db'))
+
+    index.set('/', ['unit.dependencymodel', 'unit.dependencymodel:1'])
+    index.set('/dependency/1/', ['unit.dependencymodel:1'])
+    index.set('/dependency/2/', ['unit.dependencymodel:2'])
+    index.set('/count/', ['unit.dependencymodel'])
+
+    os.makedirs(os.path.join(FAKE_WEB_ROOT, 'dependency', '1'))
+    with open(os.path.join(FAKE_WEB_ROOT, 'dependency', '1', 'index.html'), 'w') as fd:
+        fd.write('old_content')
+
+    def get_content_from_path(self, path):
+        if path == '/dependency/1/':
+            raise StaticGeneratorException('not found')
+        return 'new_content'
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator(settings=settings, dependency_index=index)
+
+            # Changed: only the pages displaying it
+            instance.publish_dependents(DependencyModel(id=1))
+            assert list_files(FAKE_WEB_ROOT) == ['index.html']
+
+            # Created: the pages listing its model too
+            instance.publish_dependents(DependencyModel(id=3), created=True)
+            assert list_files(FAKE_WEB_ROOT) == ['count/index.html', 'index.html']
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    with open(os.path.join(FAKE_WEB_ROOT, 'index.html'), 'r') as fd:
+        assert fd.read() == 'new_content'
+
+    assert not os.path.exists(os.path.join(FAKE_WEB_ROOT, 'dependency', '1', 'index.html'))
+    assert not os.path.exists(os.path.join(FAKE_WEB_ROOT, 'dependency', '2', 'index.html'))
+    assert index.get_paths(['unit.dependencymodel:1']) == ['/']
+
+
+def test_connect_dependencies_needs_models():
+    try:
+        staticgenerator.staticgenerator.connect_dependencies()
+    except StaticGeneratorException, err:
+        assert str(err) == 'You must give the models whose objects the pages display'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_objects_saved_while_rendering_dont_publish_dependents():
+    from staticgenerator.staticgenerator.dependencies import start_recording, stop_recording
+
+    keys = start_recording()
+    try:
+        assert staticgenerator.staticgenerator.publish_dependents(DependencyModel, DependencyModel(id=1)) is None
+    finally:
+        stop_recording(keys)
+
+
+def test_publish_reports_phases_to_hooks():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    calls = []
+
+    class Hook(object):
+        done_calls = 0
+
+        def __call__(self, phase, path, seconds, size):
+            calls.append((phase, path, size))
+
+        def done(self, generator):
+            self.done_calls += 1
+
+    hook = Hook()
+
+    try:
+        with remove_web_root_from_settings():
+            get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: 'some_content'
+            instance = StaticGenerator('some_path', settings=settings, hooks=[hook])
+
+            instance.publish()
+            instance.delete()
+    finally:
+        StaticGenerator.get_content_from_path = get_content_from_path
+
+    assert calls == [
+        ('extract', 'some_path', 0),
+        ('write', 'some_path', 12),
+        ('extract', 'some_path', 0),
+        ('delete', 'some_path', 0),
+    ]
+    assert hook.done_calls == 2
+
+
+def test_resources_are_split_in_shards():
+    from staticgenerator.staticgenerator import get_shard
+
+    settings = CustomSettings(WEB_ROOT="some_web_root")
+    paths = ['/page-%d/' % i for i in range(100)]
+
+    shards = [list(StaticGenerator(*paths, settings=settings, shard=(index, 3)).resources)
+              for index in range(3)]
+
+    assert sorted(sum(shards, [])) == sorted(paths)
+    assert all(shards)
+    assert shards[1] == [path for path in paths if get_shard(path, 3) == 1]
+    assert get_shard('/page-1/', 3) == get_shard('/page-1/', 3)
+
+
+def test_publish_ensures_each_directory_once():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    exists_calls = []
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+
+        exists = os.path.exists
+        os.path.exists = lambda path: exists_calls.append(path) or exists(path)
+        try:
+            instance.publish_from_path('/blog/first', content='some_content')
+            instance.publish_from_path('/blog/second', content='some_content')
+        finally:
+            os.path.exists = exists
+
+    assert exists_calls.count(os.path.join(FAKE_WEB_ROOT, 'blog')) == 1
+    assert os.path.exists(os.path.join(FAKE_WEB_ROOT, 'blog', 'second'))
+
+
+def test_publish_recreates_removed_directories():
+    import shutil
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+
+        instance.publish_from_path('/blog/first', content='some_content')
+        shutil.rmtree(os.path.join(FAKE_WEB_ROOT, 'blog'))
+        instance.publish_from_path('/blog/second', content='some_content')
+
+    assert os.path.exists(os.path.join(FAKE_WEB_ROOT, 'blog', 'second'))
+
+
+def test_ensure_directories_creates_all_directories():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+        instance.ensure_directories(['/a/b/', '/a/c', '/d/e/f/'])
+
+    assert os.path.isdir(os.path.join(FAKE_WEB_ROOT, 'a', 'b'))
+    assert os.path.isdir(os.path.join(FAKE_WEB_ROOT, 'd', 'e', 'f'))
+    assert os.path.join(FAKE_WEB_ROOT, 'a') in instance.directories
+
+
+def test_known_directories_are_bounded():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, directory_cache_size=2)
+        instance.ensure_directories(['/a/', '/b/', '/c/'])
+        assert len(instance.directories) == 2
+        assert os.path.join(FAKE_WEB_ROOT, 'a') not in instance.directories
+
+        instance.publish_from_path('/a/', 'content')
+        assert os.path.join(FAKE_WEB_ROOT, 'a') in instance.directories
+        assert os.path.join(FAKE_WEB_ROOT, 'b') not in instance.directories
+
+
+def test_publish_in_batches_writes_grouped_by_directory():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    published = []
+    synced = []
+
+    def get_content_from_path(self, path):
+        if path == '/b/broken':
+            raise StaticGeneratorException('broken')
+        return 'some_content'
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator(
+                '/b/1', '/a/1', '/b/broken', '/b/0', '/a/0',
+                settings=settings,
+                batch_size=4,
+                durability='safe',
+                collect_errors=True,
+            )
+
+            publish_from_path = instance.publish_from_path
+            instance.publish_from_path = lambda path, *args, **kw: published.append(path) or publish_from_path(path, *args, **kw)
+            instance.sync_directory = synced.append
+
+            results = instance.publish()
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert published == ['/a/1', '/b/0', '/b/1', '/a/0']
+    assert synced == [os.path.join(FAKE_WEB_ROOT, 'a'), os.path.join(FAKE_WEB_ROOT, 'b'), os.path.join(FAKE_WEB_ROOT, 'a')]
+    assert results == [True, True, None, True, True]
+    assert instance.errors[0][0] == '/b/broken'
+    assert os.path.exists(os.path.join(FAKE_WEB_ROOT, 'b', '0'))
+
+
+def test_publish_in_batches_stops_the_executor_when_a_write_fails():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+    closed = []
+
+    class Executor(object):
+
+        def map(self, generator, func, paths):
+            try:
+                for path in paths:
+                    yield path, 'some_content', None
+            finally:
+                closed.append(True)
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator('/a', '/b', '/c', settings=settings, batch_size=2, executor=Executor())
+
+        def publish_from_path(path, *args, **kw):
+            raise StaticGeneratorException('Could not write')
+        instance.publish_from_path = publish_from_path
+
+        try:
+            instance.publish()
+        except StaticGeneratorException:
+            assert closed == [True]
+            return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_durability_levels_sync_files_and_directories():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    expected = {
+        'fast': {},
+        'file': {'files': 1},
+        'safe': {'files': 1, 'directories': 1},
+    }
+    synced = {}
+
+    fsync = os.fsync
+
+    def counting_fsync(fd):
+        kind = 'directories' if os.path.isdir('/proc/self/fd/%d' % fd) else 'files'
+        synced[kind] = synced.get(kind, 0) + 1
+        return fsync(fd)
+
+    os.fsync = counting_fsync
+    try:
+        with remove_web_root_from_settings():
+            for durability in ('fast', 'file', 'safe'):
+                synced.clear()
+                instance = StaticGenerator(settings=settings, durability=durability)
+                instance.publish_from_path('/some_path', content='some_content')
+
+                assert synced == expected[durability], (durability, synced)
+    finally:
+        os.fsync = fsync
+
+
+def test_unknown_durability_raises():
+    settings = CustomSettings(WEB_ROOT="test_web_root")
+
+    try:
+        StaticGenerator(settings=settings, durability='foo')
+    except StaticGeneratorException, e:
+        assert str(e) == 'Unknown durability: foo'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_server_name_and_web_root_are_cached_between_instances():
+    from django.test.signals import setting_changed
+
+    resolved = []
+    get_server_name = StaticGenerator.get_server_name
+
+    def counting_get_server_name(self, kw={}):
+        resolved.append(kw)
+        return 'cached_server_name'
+
+    staticgenerator.staticgenerator.clear_resolved()
+    try:
+        StaticGenerator.get_server_name = counting_get_server_name
+
+        first = StaticGenerator()
+        second = StaticGenerator()
+
+        assert first.server_name == second.server_name == 'cached_server_name'
+        assert first.web_root == second.web_root == 'foo'
+        assert len(resolved) == 1
+
+        StaticGenerator(settings=CustomSettings(WEB_ROOT="test_web_root"))
+        assert len(resolved) == 2
+
+        setting_changed.send(sender=CustomSettings, setting='SERVER_NAME', value='other')
+        StaticGenerator()
+        assert len(resolved) == 3
+    finally:
+        StaticGenerator.get_server_name = get_server_name
+        staticgenerator.staticgenerator.clear_resolved()
+
+
+def test_the_localhost_fallback_is_not_cached():
+    get_server_name = StaticGenerator.get_server_name
+    names = ['localhost', 'example.com']
+
+    staticgenerator.staticgenerator.clear_resolved()
+    try:
+        StaticGenerator.get_server_name = lambda self, kw={}: names.pop(0)
+
+        assert StaticGenerator().server_name == 'localhost'
+        assert StaticGenerator().server_name == 'example.com'
+        assert StaticGenerator().server_name == 'example.com'
+    finally:
+        StaticGenerator.get_server_name = get_server_name
+        staticgenerator.staticgenerator.clear_resolved()
+
+
+def make_files(web_root, *names):
+    for name in names:
+        filename = os.path.join(web_root, name)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as fd:
+            fd.write('some_content')
+
+
+def list_files(web_root):
+    return sorted(os.path.relpath(os.path.join(directory, name), web_root)
+                  for directory, directories, names in os.walk(web_root) for name in names)
+
+
+def test_invalidate_path_ignores_missing_files():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    make_files(FAKE_WEB_ROOT, 'blog/index.html', 'blog/index.html.gz', 'blog/index.html.br', 'about/index.html')
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+        instance.invalidate_path('/blog/')
+        instance.invalidate_path('/missing/')
+
+    assert list_files(FAKE_WEB_ROOT) == ['about/index.html']
+
+
+def test_invalidate_prefix_removes_subtrees():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    make_files(FAKE_WEB_ROOT, 'index.html', 'blog/index.html', 'blog/2023/index.html',
+               'blog/2024/index.html', 'blog/2024/01/post/index.html', 'blog/2030.html')
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+
+        instance.invalidate_prefix('/blog/2024/')
+        assert list_files(FAKE_WEB_ROOT) == ['blog/2023/index.html', 'blog/2030.html',
+                                             'blog/index.html', 'index.html']
+
+        instance.invalidate_prefix('/blog/20')
+        assert list_files(FAKE_WEB_ROOT) == ['blog/index.html', 'index.html']
+
+        instance.invalidate_prefix('/missing/')
+        instance.invalidate_prefix('/missing/20')
+
+        instance.invalidate_prefix('/')
+        assert list_files(FAKE_WEB_ROOT) == []
+        assert os.path.isdir(FAKE_WEB_ROOT)
+
+
+def test_published_index_tracks_publish_and_invalidate():
+    from staticgenerator.staticgenerator.index import PublishedIndex
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, index=index, skip_unchanged=True)
+
+        for path in ('/', '/blog/1/', '/blog/1/feed/', '/blog/2/feed/'):
+            assert instance.publish_from_path(path, 'content')
+
+        assert index.get('/') == (instance.get_digest('content'), 7)
+
+        # The stored digest is used, the file isn't read
+        with open(os.path.join(FAKE_WEB_ROOT, 'index.html'), 'w') as fd:
+            fd.write('changed')
+        assert not instance.publish_from_path('/', 'content')
+        assert instance.publish_from_path('/', 'new content')
+
+        assert instance.invalidate_glob('/blog/*/feed/') == ['/blog/1/feed/', '/blog/2/feed/']
+        assert not os.path.exists(os.path.join(FAKE_WEB_ROOT, 'blog', '1', 'feed', 'index.html'))
+
+        instance.delete_from_path('/')
+        assert index.prefix('/') == ['/blog/1/']
+
+
+def test_invalidate_glob_needs_the_published_index():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings)
+
+        try:
+            instance.invalidate_glob('/*')
+        except StaticGeneratorException, err:
+            assert str(err) == 'Set STATIC_GENERATOR_INDEX to invalidate paths by pattern'
+            return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_sweep_deletes_expired_paths():
+    from staticgenerator.staticgenerator.index import PublishedIndex
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, index=index)
+
+        instance.publish_from_path('/news/', 'content', ttl=60)
+        instance.publish_from_path('/news/old/', 'content', ttl=10)
+        instance.publish_from_path('/about/', 'content')
+
+        assert instance.sweep() == []
+        assert instance.sweep(time.time() + 30) == ['/news/old/']
+        assert instance.sweep(time.time() + 90) == ['/news/']
+
+    assert list_files(FAKE_WEB_ROOT) == ['about/index.html']
+    assert index.glob('*') == ['/about/']
+
+
+def test_ttl_needs_the_published_index():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, skip_unchanged=True)
+
+        try:
+            instance.publish_from_path('/news/', 'content', ttl=60)
+        except StaticGeneratorException, err:
+            assert str(err) == 'You must specify STATIC_GENERATOR_INDEX in settings.py to expire pages'
+            return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_refresh_keeps_the_old_file_until_the_new_one_is_written():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    make_files(FAKE_WEB_ROOT, 'fresh/index.html', 'gone/index.html')
+
+    def get_content_from_path(self, path):
+        if path == '/gone/':
+            raise StaticGeneratorException('not found')
+        assert open(os.path.join(FAKE_WEB_ROOT, 'fresh', 'index.html')).read() == 'some_content'
+        return 'new_content'
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator('/fresh/', '/gone/', settings=settings)
+
+            instance.refresh()
+            instance.writer.flush()
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert list_files(FAKE_WEB_ROOT) == ['fresh/index.html']
+    assert open(os.path.join(FAKE_WEB_ROOT, 'fresh', 'index.html')).read() == 'new_content'
+
+
+def test_refresh_deletes_when_the_queue_is_full():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    make_files(FAKE_WEB_ROOT, 'page/index.html')
+
+    with remove_web_root_from_settings():
+        instance = StaticGenerator(settings=settings, queue_size=0)
+        instance.refresh_from_path('/page/')
+
+    assert instance.writer.dropped == 1
+    assert list_files(FAKE_WEB_ROOT) == []
+
+
+def test_refresh_waits_for_the_transaction_to_be_committed():
+    from django.db import transaction
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    make_files(FAKE_WEB_ROOT, 'page/index.html')
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: 'new_content'
+            instance = StaticGenerator(settings=settings)
+
+            original_is_managed = transaction.is_managed
+            transaction.is_managed = lambda: True
+            try:
+                instance.refresh_from_path('/page/')
+            finally:
+                transaction.is_managed = original_is_managed
+            assert instance.writer is None
+
+            staticgenerator.staticgenerator.flush_refreshes()
+            instance.writer.flush()
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert open(os.path.join(FAKE_WEB_ROOT, 'page', 'index.html')).read() == 'new_content'
+
+
+def test_apublish_renders_concurrently_and_writes_every_page():
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    paths = ['/page/%d/' % i for i in range(20)] + ['/missing/']
+    rendering = set()
+    overlaps = []
+
+    def get_content_from_path(self, path):
+        rendering.add(path)
+        time.sleep(0.01)
+        overlaps.append(len(rendering))
+        rendering.discard(path)
+        if path == '/missing/':
+            raise StaticGeneratorException('not found')
+        return 'content of %s' % path
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator(*paths, settings=settings, collect_errors=True)
+
+            results = instance.apublish(concurrency=10).get(10)
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert results == [True] * 20 + [None]
+    assert instance.stats == {'written': 20, 'skipped': 0}
+    assert [path for path, error in instance.errors] == ['/missing/']
+    assert max(overlaps) > 1
+    with open(os.path.join(FAKE_WEB_ROOT, 'page', '3', 'index.html')) as fd:
+        assert fd.read() == 'content of /page/3/'
+
+
+def test_apublish_raises_the_first_error():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+
+    def get_content_from_path(self, path):
+        raise StaticGeneratorException('not found')
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+            instance = StaticGenerator('/', '/about/', settings=settings)
+
+            instance.apublish().get(10)
+    except StaticGeneratorException, err:
+        assert str(err) == 'not found'
+        return
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_apublish_raises_index_errors_instead_of_blocking():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+    paths = ['/page/%d/' % i for i in range(20)]
+
+    @contextmanager
+    def batch_index():
+        yield
+        raise IOError('database is locked')
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = lambda self, path: 'content'
+            instance = StaticGenerator(*paths, settings=settings)
+            instance.batch_index = batch_index
+
+            instance.apublish(concurrency=2).get(10)
+    except IOError, err:
+        assert str(err) == 'database is locked'
+        return
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_web_roots_are_written_from_a_single_render():
+    web_roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    rendered = []
+
+    def get_content_from_path(self, path):
+        rendered.append(path)
+        return 'content'
+
+    try:
+        original_get_content_from_path = StaticGenerator.get_content_from_path
+        StaticGenerator.get_content_from_path = get_content_from_path
+        instance = StaticGenerator('/', '/blog/1/', web_roots=web_roots)
+
+        assert instance.publish() == [True, True]
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert rendered == ['/', '/blog/1/']
+    for web_root in web_roots:
+        assert list_files(web_root) == ['blog/1/index.html', 'index.html']
+
+    instance.delete_from_path('/blog/1/')
+    for web_root in web_roots:
+        assert list_files(web_root) == ['index.html']
+
+
+def test_web_roots_report_failing_targets():
+    web_root = tempfile.mkdtemp()
+    make_files(web_root, 'not_a_directory')
+    broken = os.path.join(web_root, 'not_a_directory', 'web_root')
+    working = tempfile.mkdtemp()
+
+    instance = StaticGenerator(web_roots=[broken, working])
+
+    assert instance.publish_from_path('/', 'content')
+    assert list_files(working) == ['index.html']
+    assert [(root, path) for root, path, error in instance.target_errors] == [(broken, '/')]
+
+    instance = StaticGenerator(web_roots=[broken])
+
+    try:
+        instance.publish_from_path('/', 'content')
+    except StaticGeneratorException, err:
+        assert str(err) == 'Could not create the directory: %s' % broken
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_publish_generation_links_unchanged_files_and_flips_the_web_root():
+    from staticgenerator.staticgenerator.index import PublishedIndex
+
+    web_root = os.path.join(tempfile.mkdtemp(), 'site')
+    settings = CustomSettings(WEB_ROOT=web_root)
+    index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+    index.add('/gone/', 'digest', 4)
+    contents = {'/': 'home', '/blog/1/': 'post'}
+
+    def get_content_from_path(self, path):
+        if contents[path] is None:
+            raise StaticGeneratorException('not found')
+        return contents[path]
+
+    def inode(generation, name):
+        return os.stat(os.path.join(generation, name)).st_ino
+
+    try:
+        original_get_content_from_path = StaticGenerator.get_content_from_path
+        StaticGenerator.get_content_from_path = get_content_from_path
+        with remove_web_root_from_settings():
+            instance = StaticGenerator('/', '/blog/1/', settings=settings, generations=2, index=index)
+        generations = staticgenerator.staticgenerator.Generations(web_root, 2)
+
+        instance.publish_generation()
+        first = generations.current()
+        assert list_files(web_root + '/') == ['blog/1/index.html', 'index.html']
+        assert index.glob('*') == ['/', '/blog/1/']
+
+        contents['/'] = 'new home'
+        assert instance.publish_generation() == [True, False]
+        second = generations.current()
+        assert second != first
+        assert inode(first, 'blog/1/index.html') == inode(second, 'blog/1/index.html')
+        assert inode(first, 'index.html') != inode(second, 'index.html')
+        with open(os.path.join(web_root, 'index.html')) as fd:
+            assert fd.read() == 'new home'
+
+        contents['/blog/1/'] = None
+        try:
+            instance.publish_generation()
+            assert False, "Shouldn't have gotten this far."
+        except StaticGeneratorException, err:
+            assert str(err) == 'not found'
+        assert generations.current() == second
+        assert index.get('/') == (instance.get_digest('new home'), 8)
+        assert generations.list() == [first, second]
+
+        contents['/blog/1/'] = 'post'
+        instance.publish_generation()
+        assert generations.list() == [second, generations.current()]
+
+        generations.rollback()
+        assert generations.current() == second
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+
+def test_publish_generation_needs_a_symlinked_web_root():
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+    with remove_web_root_from_settings():
+        instance = StaticGenerator('/', settings=settings)
+
+    try:
+        instance.publish_generation()
+    except StaticGeneratorException, err:
+        assert str(err).startswith('Could not create a generation: ')
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_publish_generation_refuses_several_web_roots():
+    instance = StaticGenerator('/', web_roots=[tempfile.mkdtemp(), tempfile.mkdtemp()])
+
+    try:
+        instance.publish_generation()
+    except StaticGeneratorException, err:
+        assert str(err) == 'Generations can not be used with STATIC_GENERATOR_WEB_ROOTS'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_render_cache_skips_rendering_within_a_run_and_unchanged_writes():
+    from staticgenerator.staticgenerator.cache import RenderCache
+
+    FAKE_WEB_ROOT = tempfile.mkdtemp()
+    settings = CustomSettings(WEB_ROOT=FAKE_WEB_ROOT)
+    cache = RenderCache(max_bytes=1000)
+    rendered = []
+    contents = {'/': 'content', '/about/': 'content'}
+
+    def get_content_from_path(self, path):
+        rendered.append(path)
+        return contents[path]
+
+    try:
+        with remove_web_root_from_settings():
+            original_get_content_from_path = StaticGenerator.get_content_from_path
+            StaticGenerator.get_content_from_path = get_content_from_path
+
+            instance = StaticGenerator('/', '/about/', '/', settings=settings, render_cache=cache)
+            assert instance.publish() == [True, True]
+            assert rendered == ['/', '/about/']
+
+            # Rendered again by the next run, not written again
+            instance = StaticGenerator('/', settings=settings, render_cache=cache)
+            assert instance.publish() == [False]
+            assert rendered == ['/', '/about/', '/']
+            assert cache.stats() == {'hits': 1, 'misses': 2, 'entries': 2, 'bytes': 14}
+            assert not instance.publish_from_path('/about/', 'content')
+            assert instance.publish_from_path('/about/', 'changed')
+
+            # The data changed since the page was cached
+            contents['/'] = 'new content'
+            assert instance.publish() == [True]
+            assert open(os.path.join(FAKE_WEB_ROOT, 'index.html')).read() == 'new content'
+
+            # The file was removed since the page was cached
+            os.remove(os.path.join(FAKE_WEB_ROOT, 'about', 'index.html'))
+            assert instance.publish_from_path('/about/', 'changed')
+            assert open(os.path.join(FAKE_WEB_ROOT, 'about', 'index.html')).read() == 'changed'
+    finally:
+        StaticGenerator.get_content_from_path = original_get_content_from_path
+
+    assert rendered == ['/', '/about/', '/', '/']
+
+
+def test_pool_executors_read_paths_a_window_at_a_time():
+    from staticgenerator.staticgenerator.executors import ThreadPoolExecutor, ProcessPoolExecutor
+
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+
+    for executor in (ThreadPoolExecutor(2), ProcessPoolExecutor(2)):
+        produced = []
+
+        def paths():
+            for i in range(1000):
+                produced.append(i)
+                yield '/%d/' % i
+
+        with remove_web_root_from_settings():
+            instance = StaticGenerator(settings=settings)
+
+            mapped = executor.map(instance, instance.get_filename_from_path, paths())
+            assert next(mapped)[0] == '/0/'
+            mapped.close()
+
+        assert len(produced) <= 5
+
+
+def test_process_executor_runs_can_nest():
+    from staticgenerator.staticgenerator.executors import ProcessPoolExecutor
+
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+
+    with remove_web_root_from_settings():
+        outer = StaticGenerator(settings=settings)
+        inner = StaticGenerator(settings=CustomSettings(WEB_ROOT=tempfile.mkdtemp()))
+
+        outer_results = ProcessPoolExecutor(2).map(outer, outer.get_filename_from_path, ['/a', '/b'])
+        assert next(outer_results)[1][0] == os.path.join(outer.web_root, 'a')
+
+        inner_results = list(ProcessPoolExecutor(2).map(inner, inner.get_filename_from_path, ['/c']))
+        assert inner_results[0][1][0] == os.path.join(inner.web_root, 'c')
+
+        assert next(outer_results)[1][0] == os.path.join(outer.web_root, 'b')
+        outer_results.close()
+
+
+def test_process_executor_keeps_uncommitted_changes():
+    import django.db
+    import sqlite3
+    from django.db.utils import ConnectionHandler
+    from staticgenerator.staticgenerator.executors import ProcessPoolExecutor
+
+    filename = os.path.join(tempfile.mkdtemp(), 'db.sqlite')
+    connections = ConnectionHandler({'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': filename}})
+    connection = connections['default']
+    connection.cursor().execute('CREATE TABLE article (title TEXT)')
+
+    settings = CustomSettings(WEB_ROOT=tempfile.mkdtemp())
+    original_connections = django.db.connections
+    django.db.connections = connections
+    try:
+        with remove_web_root_from_settings():
+            instance = StaticGenerator(settings=settings)
+
+        connection.enter_transaction_management()
+        connection.managed(True)
+        connection.cursor().execute("INSERT INTO article VALUES ('saved')")
+        connection.set_dirty()
+
+        results = list(ProcessPoolExecutor(2).map(instance, instance.get_filename_from_path, ['/a']))
+        assert results[0][1][0] == os.path.join(instance.web_root, 'a')
+
+        connection.commit()
+        connection.leave_transaction_management()
+    finally:
+        django.db.connections = original_connections
+        connection.close()
+
+    assert sqlite3.connect(filename).execute('SELECT title FROM article').fetchall() == [('saved',)]
+
+
+def test_web_roots_skip_unchanged_compares_each_web_root():
+    from staticgenerator.staticgenerator.index import PublishedIndex
+
+    web_roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+    instance = StaticGenerator(web_roots=web_roots, skip_unchanged=True, index=index)
+
+    assert instance.publish_from_path('/', 'v1')
+    assert instance.publish_from_path('/', 'v2')
+    assert not instance.publish_from_path('/', 'v2')
+
+    for web_root in web_roots:
+        with open(os.path.join(web_root, 'index.html')) as fd:
+            assert fd.read() == 'v2'
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from staticgenerator.staticgenerator import StaticGenerator, StaticGeneratorException
+from staticgenerator.staticgenerator.index import PublishedIndex
+from staticgenerator.staticgenerator.storage import ArchiveStorage, MemoryStorage
+
+
+def test_memory_storage_publishes_and_deletes():
+    storage = MemoryStorage()
+    instance = StaticGenerator(storage=storage, compress=('gzip',), compress_min_size=0)
+    web_root = instance.web_root
+
+    instance.publish_from_path('/blog/1/', 'content')
+    instance.publish_from_path('/blog/2/', 'content')
+
+    assert sorted(storage.files) == [
+        os.path.join(web_root, 'blog', '1', 'index.html'),
+        os.path.join(web_root, 'blog', '1', 'index.html.gz'),
+        os.path.join(web_root, 'blog', '2', 'index.html'),
+        os.path.join(web_root, 'blog', '2', 'index.html.gz'),
+    ]
+    assert storage.listdir(os.path.join(web_root, 'blog')) == ['1', '2']
+
+    instance.delete_from_path('/blog/1/')
+    assert not storage.exists(os.path.join(web_root, 'blog', '1'))
+
+    instance.invalidate_prefix('/blog/')
+    assert storage.files == {}
+
+
+def test_memory_storage_skips_unchanged_content():
+    storage = MemoryStorage()
+    instance = StaticGenerator(storage=storage, skip_unchanged=True)
+
+    assert instance.publish_from_path('/', 'content')
+    assert not instance.publish_from_path('/', 'content')
+    assert instance.publish_from_path('/', 'changed')
+
+
+def test_archive_storage_writes_a_tar_on_close():
+    filename = os.path.join(tempfile.mkdtemp(), 'site.tar.gz')
+    instance = StaticGenerator(storage=ArchiveStorage(filename))
+
+    instance.publish_from_path('/', 'home')
+    instance.publish_from_path('/blog/1/', 'post')
+    assert not os.path.exists(filename)
+
+    instance.close()
+
+    archive = tarfile.open(filename)
+    assert sorted(archive.getnames()) == ['blog/1/index.html', 'index.html']
+    assert archive.extractfile('blog/1/index.html').read() == 'post'
+
+
+def test_other_storages_ignore_the_indexes_of_the_settings():
+    from django.conf import settings
+
+    index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+    own_index = PublishedIndex(os.path.join(tempfile.mkdtemp(), 'published.db'))
+    settings.STATIC_GENERATOR_INDEX = index
+    try:
+        instance = StaticGenerator(storage=MemoryStorage())
+        assert instance.published is None
+        instance.publish_from_path('/', 'content')
+
+        instance = StaticGenerator(storage=MemoryStorage(), index=own_index)
+        instance.publish_from_path('/about/', 'content')
+    finally:
+        del settings.STATIC_GENERATOR_INDEX
+
+    assert list(index.prefix('/')) == []
+    assert list(own_index.prefix('/')) == ['/about/']
+
+
+def test_archive_storage_writes_a_zip():
+    filename = os.path.join(tempfile.mkdtemp(), 'site.zip')
+    instance = StaticGenerator(storage=ArchiveStorage(filename))
+
+    instance.publish_from_path('/about/', 'about')
+    instance.close()
+
+    archive = zipfile.ZipFile(filename)
+    assert archive.namelist() == ['about/index.html']
+    assert archive.read('about/index.html') == 'about'
+
+
+def test_archive_storage_can_not_delete_files():
+    instance = StaticGenerator(storage=ArchiveStorage(os.path.join(tempfile.mkdtemp(), 'site.tar')))
+    instance.publish_from_path('/', 'home')
+
+    try:
+        instance.delete_from_path('/')
+    except StaticGeneratorException, err:
+        assert str(err) == 'Could not delete file: %s' % os.path.join(instance.web_root, 'index.html')
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_unknown_storage_raises():
+    try:
+        StaticGenerator(storage='cloud')
+    except StaticGeneratorException, err:
+        assert str(err) == 'Unknown storage: cloud'
+        return
+
+    assert False, "Shouldn't have gotten this far."
+
+
+def test_archive_storage_abort_leaves_the_previous_archive():
+    filename = os.path.join(tempfile.mkdtemp(), 'site.tar')
+    with open(filename, 'w') as fd:
+        fd.write('previous')
+
+    storage = ArchiveStorage(filename)
+    StaticGenerator(storage=storage).publish_from_path('/', 'home')
+    storage.abort()
+
+    assert os.listdir(os.path.dirname(filename)) == ['site.tar']
+    with open(filename) as fd:
+        assert fd.read() == 'previous'
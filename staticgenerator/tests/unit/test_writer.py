@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import threading
+
+from staticgenerator.staticgenerator.writer import BackgroundWriter
+
+
+class BlockingGenerator(object):
+
+    def __init__(self):
+        self.published = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def publish_from_path(self, path, content, ttl=None):
+        self.started.set()
+        self.release.wait()
+        self.published.append((path, content))
+
+
+def test_writer_publishes_in_background():
+    generator = BlockingGenerator()
+    generator.release.set()
+
+    writer = BackgroundWriter(generator)
+    assert writer.put('some_path', 'some_content')
+    writer.flush()
+
+    assert generator.published == [('some_path', 'some_content')]
+
+
+def test_writer_coalesces_pending_paths_and_drops_when_full():
+    generator = BlockingGenerator()
+
+    writer = BackgroundWriter(generator, maxsize=1, timeout=0)
+    writer.put('first_path', 'first_content')
+    generator.started.wait()
+
+    assert writer.put('second_path', 'old_content')
+    assert writer.put('second_path', 'new_content')
+    assert not writer.put('third_path', 'some_content')
+
+    generator.release.set()
+    writer.flush()
+
+    assert generator.published == [('first_path', 'first_content'), ('second_path', 'new_content')]
+    assert writer.dropped == 1
+
+
+def test_writer_calls_done_once_written():
+    generator = BlockingGenerator()
+    done = []
+
+    writer = BackgroundWriter(generator)
+    writer.put('some_path', 'some_content', done=lambda: done.append(list(generator.published)))
+    generator.started.wait()
+    assert done == []
+
+    generator.release.set()
+    writer.flush()
+
+    assert done == [[('some_path', 'some_content')]]
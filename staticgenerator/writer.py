@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Write-behind queue used to publish pages outside of the request cycle."""
+from collections import OrderedDict
+from django.db import close_connection
+
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger('staticgenerator')
+
+
+class BackgroundWriter(object):
+    """
+    Publishes (path, content, ttl) from a background thread, so the caller
+    doesn't wait for the disk.
+
+    A page queued for a path that is still pending replaces the pending
+    content instead of being written twice. When maxsize pages are pending,
+    put() waits up to timeout seconds for room (forever if timeout is None)
+    and drops the page after that. Pending pages are flushed when the
+    process exits.
+
+    A page queued with None content is rendered again by the writer, and
+    deleted if it can't be rendered any more (see
+    StaticGenerator.republish_from_path). The database connections of the
+    writer thread are closed after every page.
+    """
+
+    def __init__(self, generator, maxsize=1000, timeout=0):
+        self.generator = generator
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.writing = False
+        self.dropped = 0
+
+    def start(self):
+        if self.thread is None:
+            atexit.register(self.flush)
+
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='staticgenerator-writer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def put(self, path, content, ttl=None, done=None):
+        """
+        Queues content to be written to path. done is called, without
+        arguments, once it was written or failed. Returns False if dropped,
+        done being left to the caller.
+        """
+        with self.condition:
+            if path not in self.pending and not self.wait_for_room():
+                self.dropped += 1
+                logger.warning('Write queue is full, dropping %s', path)
+                return False
+
+            callbacks = self.pending[path][2] if path in self.pending else []
+            if done is not None:
+                callbacks.append(done)
+            self.pending[path] = (content, ttl, callbacks)
+            self.start()
+            self.condition.notify_all()
+
+        return True
+
+    def wait_for_room(self):
+        deadline = None if self.timeout is None else time.time() + self.timeout
+
+        while len(self.pending) >= self.maxsize:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.condition.wait(remaining)
+
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+                path, (content, ttl, callbacks) = self.pending.popitem(last=False)
+                self.writing = True
+                self.condition.notify_all()
+
+            try:
+                if content is None:
+                    self.generator.republish_from_path(path)
+                else:
+                    self.generator.publish_from_path(path, content, ttl=ttl)
+            except Exception:
+                logger.exception('Could not publish %s', path)
+            finally:
+                for done in callbacks:
+                    try:
+                        done()
+                    except Exception:
+                        logger.exception('Could not complete the write of %s', path)
+
+                # Every page is rendered in a new transaction, seeing the
+                # latest commits, and no connection is left open in between
+                close_connection()
+
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        """Waits until every pending page has been written"""
+        with self.condition:
+            while (self.pending or self.writing) and self.thread is not None and self.thread.is_alive():
+                self.condition.wait(1)